@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import shutil
+
+import numpy as np
+
+QUANTIZATIONS = ("float16", "int8")
+
+
+def catalog_key(content_hashes: list) -> str:
+    """Identifies a set of grant vectors by the content of the grants, in index order."""
+    return hashlib.sha1("\n".join(content_hashes).encode("utf-8")).hexdigest()[:16]
+
+
+class Int8Matrix:
+    """int8 vectors with a per-dimension scale; indexing returns dequantized float32 rows."""
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        return self.codes[rows].astype(np.float32) * self.scales
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int, seed: int) -> np.ndarray:
+    """Spherical k-means (cosine) on a sample; returns L2-normalized centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 256), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty lists from random points so every list stays in use.
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class AnnIndex:
+    """
+    Inverted-file (IVF) index over L2-normalized grant embeddings, for cosine top-k retrieval.
+
+    Vectors are stored quantized (float16, or int8 with a per-dimension scale) in .npy files under
+    one directory per catalog key and opened with mmap_mode="r", so every process serving the same
+    catalog shares one copy through the page cache instead of holding its own float32 matrix.
+    Vectors stay in grant index order, so vectors[rows] serves the full scorer as well.
+    int8 indexes also keep a float16 copy, source_vectors, that rebuilds start from: quantizing
+    dequantized vectors again would add error on every catalog reload.
+
+    Catalogs smaller than min_size are searched exhaustively; IVF only pays off on large ones.
+    """
+
+    def __init__(self, directory: str, vectors, centroids: np.ndarray, list_rows: np.ndarray,
+                 list_offsets: np.ndarray, nprobe: int = 8, min_size: int = 2000, source_vectors=None):
+        self.directory = directory
+        self.vectors = vectors
+        self.source_vectors = vectors if source_vectors is None else source_vectors
+        self.centroids = centroids
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+        self.min_size = min_size
+
+    def __len__(self):
+        return len(self.vectors)
+
+    # ----- persistence -----
+
+    @classmethod
+    def build(cls, root: str, key: str, vectors: np.ndarray, quantization: str = "float16", nlist: int = None,
+              iterations: int = 10, seed: int = 0, **options) -> "AnnIndex":
+        """Clusters and quantizes vectors, writes them under root/key and returns the memory-mapped index."""
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}.")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n) or 1
+        centroids = _kmeans(vectors, nlist, iterations, seed) if n else np.zeros((1, vectors.shape[1]), np.float32)
+        assignment = np.argmax(vectors @ centroids.T, axis=1) if n else np.zeros(0, dtype=np.int64)
+        list_rows = np.argsort(assignment, kind="stable").astype(np.int32)
+        list_offsets = np.searchsorted(assignment[list_rows], np.arange(len(centroids) + 1)).astype(np.int64)
+
+        arrays = {"centroids": centroids, "list_rows": list_rows, "list_offsets": list_offsets}
+        if quantization == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=0) if n else np.ones(vectors.shape[1]), 1e-12) / 127
+            arrays["codes"] = np.round(vectors / scales).astype(np.int8)
+            arrays["scales"] = scales.astype(np.float32)
+            arrays["source"] = vectors.astype(np.float16)
+        else:
+            arrays["vectors"] = vectors.astype(np.float16)
+
+        directory = os.path.join(root, key)
+        tmp_directory = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(tmp_directory, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_directory, f"{name}.npy"), array)
+        try:
+            os.rename(tmp_directory, directory)
+        except OSError:  # another process published the same key first
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+        cls.prune(root, keep=key)
+        logging.info(f"ANN index built for {n} grants: {len(centroids)} lists, {quantization} vectors.")
+        return cls.open(root, key, **options)
+
+    @classmethod
+    def open(cls, root: str, key: str, **options):
+        """Opens a published index memory-mapped, or returns None if there is none for this key."""
+        directory = os.path.join(root, key)
+        if not os.path.isdir(directory):
+            return None
+
+        def load(name, mmap_mode="r"):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        try:
+            source_vectors = None
+            if os.path.exists(os.path.join(directory, "codes.npy")):
+                vectors = Int8Matrix(load("codes"), load("scales", None))
+                if os.path.exists(os.path.join(directory, "source.npy")):
+                    source_vectors = load("source")
+            else:
+                vectors = load("vectors")
+            return cls(directory, vectors, load("centroids", None), load("list_rows", None),
+                       load("list_offsets", None), source_vectors=source_vectors, **options)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not open ANN index {directory}: {e}")
+            return None
+
+    @staticmethod
+    def prune(root: str, keep: str):
+        """Deletes indexes for other catalog keys. Processes still mapping them keep their pages until they reload."""
+        for name in os.listdir(root):
+            if name != keep and ".tmp" not in name:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    # ----- search -----
+
+    def search(self, query: np.ndarray, k: int, rows=None) -> np.ndarray:
+        """
+        Returns up to k grant rows with the highest approximate cosine to query, best first.
+        rows, if given, restricts results to those grant rows (e.g. the catalog's eligibility pre-filter);
+        lists are probed in centroid order until k allowed candidates have been seen.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        n = len(self.vectors)
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(n, dtype=bool)
+            allowed[np.asarray(rows, dtype=np.int64)] = True
+
+        if n < self.min_size:
+            candidates = np.arange(n) if allowed is None else np.flatnonzero(allowed)
+        else:
+            probe_order = np.argsort(-(self.centroids @ query))
+            nprobe = self.nprobe
+            if allowed is not None:
+                # Probe proportionally more lists when most rows are filtered out.
+                nprobe = int(np.ceil(nprobe * n / max(len(rows), 1)))
+            found, seen = [], 0
+            for probed, list_id in enumerate(probe_order, 1):
+                members = self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+                if allowed is not None:
+                    members = members[allowed[members]]
+                found.append(members)
+                seen += len(members)
+                if probed >= nprobe and seen >= k:
+                    break
+            candidates = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+        if len(candidates) == 0:
+            return candidates.astype(np.int64)
+        # Sorted rows read the memory map front to back.
+        candidates = np.sort(candidates)
+        scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        return candidates[np.argsort(-scores, kind="stable")].astype(np.int64)
@@ -0,0 +1,176 @@
+"""
+JSON matching API on aiohttp.
+
+    python api.py                      # serves on port 8080
+    POST /api/match  {"url": "https://example.org", "include_ineligible": false, "profile": false}
+    GET  /healthz, GET /ready, POST /warmup, GET /metrics
+
+Models load in the background when the server starts; /ready answers 503 until they are warm.
+
+Website fetches are awaited on the event loop. NLP and scoring run in a bounded thread pool;
+when the pool and its queue are full the API answers 503 with Retry-After instead of queueing
+without limit. Concurrent requests for the same URL share one computation, and with "profile": true
+each of them gets that computation's stage breakdown.
+"""
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+from aiohttp import web
+
+from config import ALLOW_REQUEST_PROFILING, INFERENCE_QUEUE_DEPTH, INFERENCE_WORKERS, WARMUP_ON_START
+from main import (FETCHER, NO_ELIGIBLE_GRANTS_MESSAGE, match_website, readiness, start_warmup, validate_url,
+                  warmup)
+from metrics import CONTENT_TYPE, REGISTRY, REQUESTS, profiled
+
+
+class PoolSaturated(Exception):
+    """Raised when the inference pool already has as much work as it is allowed to queue."""
+
+
+class InferencePool:
+    """Thread pool for CPU-bound matching work with a hard cap on running plus queued jobs."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.max_pending = workers + max_queue
+        self.pending = 0
+
+    async def run(self, func, *args):
+        # Only touched from the event loop thread, so a plain counter is enough.
+        if self.pending >= self.max_pending:
+            raise PoolSaturated()
+        self.pending += 1
+        try:
+            # Run in a copy of the caller's context so stage timings reach the request's profile.
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def normalize_url(url: str) -> str:
+    """Key used to coalesce requests: scheme and host lowercased, fragment dropped."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+class Matcher:
+    """Fetches and matches NGO websites, sharing in-flight work between requests for the same URL."""
+
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+        self._in_flight = {}
+
+    async def match(self, url: str) -> dict:
+        key = normalize_url(url)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(url))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logging.info(f"Coalescing request for {url} with the one already in flight.")
+        # shield() so one client disconnecting does not cancel the work other clients are waiting on.
+        return await asyncio.shield(task)
+
+    async def _compute(self, url: str) -> dict:
+        with profiled(ALLOW_REQUEST_PROFILING) as profile:
+            website_raw_text = await FETCHER.fetch_text_async(url)
+            if website_raw_text.startswith("Error"):
+                logging.error(f"Scraping failed for {url}: {website_raw_text}")
+                result = {"error": website_raw_text, "matches": []}
+            else:
+                result = {"error": None, "matches": await self.pool.run(match_website, website_raw_text)}
+            result["profile"] = profile.as_dict() if profile else None
+            return result
+
+
+async def match_handler(request: web.Request) -> web.Response:
+    try:
+        payload = await request.json()
+    except ValueError:
+        return web.json_response({"error": "Request body must be JSON."}, status=400)
+    if not isinstance(payload, dict):
+        return web.json_response({"error": "Request body must be a JSON object."}, status=400)
+    url = str(payload.get("url", "")).strip()
+    if not validate_url(url):
+        REQUESTS.inc(endpoint="api", outcome="invalid_url")
+        return web.json_response({"error": "Invalid URL. Please enter a valid HTTP/HTTPS URL."}, status=400)
+
+    logging.info(f"Received API request for URL: {url}")
+    try:
+        result = await request.app["matcher"].match(url)
+    except PoolSaturated:
+        REQUESTS.inc(endpoint="api", outcome="busy")
+        return web.json_response({"error": "Server is busy. Please retry shortly."}, status=503,
+                                 headers={"Retry-After": "5"})
+    extra = {"profile": result["profile"]} if payload.get("profile") and result["profile"] else {}
+    if result["error"]:
+        REQUESTS.inc(endpoint="api", outcome="fetch_error")
+        return web.json_response({"url": url, "error": result["error"], "matches": [], **extra}, status=502)
+
+    matches = result["matches"]
+    eligible_count = sum(1 for match in matches if match["is_eligible"])
+    REQUESTS.inc(endpoint="api", outcome="ok" if eligible_count else "no_match")
+    if not payload.get("include_ineligible", False):
+        matches = [match for match in matches if match["is_eligible"]]
+    return web.json_response({
+        "url": url,
+        "error": None if eligible_count else NO_ELIGIBLE_GRANTS_MESSAGE,
+        "eligible_count": eligible_count,
+        "matches": matches,
+        **extra,
+    })
+
+
+async def healthz_handler(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def ready_handler(request: web.Request) -> web.Response:
+    status = readiness()
+    if not status["ready"]:
+        start_warmup()
+    return web.json_response(status, status=200 if status["ready"] else 503)
+
+
+async def warmup_handler(request: web.Request) -> web.Response:
+    await asyncio.get_running_loop().run_in_executor(None, warmup)
+    return web.json_response(readiness())
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def _start_warmup(app: web.Application):
+    start_warmup()
+
+
+async def _close_resources(app: web.Application):
+    await FETCHER.aclose()
+    app["matcher"].pool.shutdown()
+
+
+def create_app(workers: int = INFERENCE_WORKERS, max_queue: int = INFERENCE_QUEUE_DEPTH) -> web.Application:
+    app = web.Application()
+    app["matcher"] = Matcher(InferencePool(workers, max_queue))
+    app.router.add_post("/api/match", match_handler)
+    app.router.add_get("/healthz", healthz_handler)
+    app.router.add_get("/ready", ready_handler)
+    app.router.add_post("/warmup", warmup_handler)
+    app.router.add_get("/metrics", metrics_handler)
+    if WARMUP_ON_START:
+        app.on_startup.append(_start_warmup)
+    app.on_cleanup.append(_close_resources)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=8080)
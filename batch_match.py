@@ -0,0 +1,208 @@
+"""
+Bulk offline matching of NGO websites against the grant catalog.
+
+    python batch_match.py ngos.jsonl results.jsonl --workers 4 --concurrency 32
+
+Each input line is a JSON object with a "url" (and optionally an "id"), a JSON string, or a bare URL.
+Sites are fetched concurrently; scoring runs in a process pool whose workers load the
+SentenceTransformer and spaCy models once. Results are appended to the output as they complete,
+one JSON object per line, and the output doubles as the checkpoint: rerunning the same command
+skips every record already written, so a crashed run resumes where it stopped. With --retry-errors,
+retried records are appended too, and the output is compacted at the end to the last record per id.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import FETCH_CACHE_PATH, MAX_HTML_BYTES, MAX_TEXT_LENGTH
+from fetcher import CacheStore, SiteFetcher
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_worker_main = None
+
+
+def _init_worker():
+    """Process pool initializer: loads and warms the models once per worker."""
+    global _worker_main
+    logging.getLogger().setLevel(logging.WARNING)
+    import main
+    main.warmup()
+    main.wait_for_refit()  # score every NGO with the catalog's own vocabulary, not a stale one
+    _worker_main = main
+
+
+def _score(website_raw_text: str, top_k: int, include_ineligible: bool) -> list:
+    matches = _worker_main.match_website(website_raw_text, top_k=top_k)
+    return matches if include_ineligible else [match for match in matches if match["is_eligible"]]
+
+
+def iter_records(path: str):
+    """Yields {"id", "url"} records from a JSONL file without reading it all into memory."""
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = line  # bare URL
+            if isinstance(record, str):
+                record = {"url": record}
+            if not isinstance(record, dict) or not record.get("url"):
+                logging.warning(f"Skipping line {line_number}: no url.")
+                continue
+            record.setdefault("id", record["url"])
+            yield record
+
+
+def load_checkpoint(path: str, retry_errors: bool = False) -> set:
+    """
+    Returns the ids already written to the output file. A partially written last line (from a crash)
+    is truncated so the file stays valid JSONL.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good_offset = 0
+    with open(path, "rb") as handle:
+        for line in handle:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                break
+            good_offset += len(line)
+            if not (retry_errors and result.get("error")):
+                done.add(result.get("id"))
+    if good_offset < os.path.getsize(path):
+        logging.warning(f"Truncating incomplete record at the end of {path}.")
+        with open(path, "r+b") as handle:
+            handle.truncate(good_offset)
+    return done
+
+
+def compact_output(path: str) -> int:
+    """
+    Rewrites the output keeping only the last record per id (a retry supersedes the error it retried).
+    Only ids are held in memory; the file is replaced atomically. Returns the number of records dropped.
+    """
+    last_line = {}
+    with open(path, "rb") as handle:
+        for line_number, line in enumerate(handle):
+            last_line[json.loads(line).get("id")] = line_number
+    kept = set(last_line.values())
+    dropped = line_number + 1 - len(kept) if last_line else 0
+    if not dropped:
+        return 0
+    temporary = f"{path}.compact"
+    with open(path, "rb") as source, open(temporary, "wb") as target:
+        for line_number, line in enumerate(source):
+            if line_number in kept:
+                target.write(line)
+    os.replace(temporary, path)
+    return dropped
+
+
+class Progress:
+    def __init__(self, report_every: float):
+        self.report_every = report_every
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.last_done = 0
+        self.done = 0
+        self.errors = 0
+
+    def record(self, error: bool):
+        self.done += 1
+        self.errors += int(error)
+        now = time.monotonic()
+        if now - self.last_report >= self.report_every:
+            self.report(now)
+
+    def report(self, now: float = None):
+        now = now or time.monotonic()
+        overall = self.done / max(now - self.started, 1e-9)
+        recent = (self.done - self.last_done) / max(now - self.last_report, 1e-9)
+        logging.info(f"{self.done} sites done ({self.errors} errors): {recent:.2f} sites/sec now, {overall:.2f} sites/sec overall")
+        self.last_report, self.last_done = now, self.done
+
+
+async def run(args) -> Progress:
+    done = load_checkpoint(args.output, args.retry_errors)
+    if done:
+        logging.info(f"Resuming: {len(done)} records already in {args.output}.")
+
+    fetcher = SiteFetcher(CacheStore(FETCH_CACHE_PATH), MAX_TEXT_LENGTH, MAX_HTML_BYTES, per_host=args.per_host)
+    # spawn, so workers do not inherit the fetcher's threads and load their own models.
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    loop = asyncio.get_running_loop()
+    fetch_slots = asyncio.Semaphore(args.concurrency)
+    # Bound everything in flight so a huge input file is streamed rather than loaded.
+    admission = asyncio.Semaphore(args.concurrency + args.workers * 2)
+    progress = Progress(args.report_every)
+    tasks = set()
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        async def handle(record: dict):
+            try:
+                async with fetch_slots:
+                    website_raw_text = await fetcher.fetch_text_async(record["url"])
+                if website_raw_text.startswith("Error"):
+                    result = {"id": record["id"], "url": record["url"], "error": website_raw_text, "matches": []}
+                else:
+                    matches = await loop.run_in_executor(pool, _score, website_raw_text, args.top_k,
+                                                         args.include_ineligible)
+                    result = {"id": record["id"], "url": record["url"], "error": None,
+                              "eligible_count": sum(1 for match in matches if match["is_eligible"]),
+                              "matches": matches}
+            except Exception as e:
+                logging.error(f"Failed to match {record['url']}: {e}", exc_info=True)
+                result = {"id": record["id"], "url": record["url"], "error": f"Error: {e}", "matches": []}
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            progress.record(bool(result["error"]))
+
+        try:
+            for record in iter_records(args.input):
+                if record["id"] in done:
+                    continue
+                done.add(record["id"])  # also drops duplicate ids within the input
+                await admission.acquire()
+                task = asyncio.create_task(handle(record))
+                tasks.add(task)
+                task.add_done_callback(lambda finished: (tasks.discard(finished), admission.release()))
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            await fetcher.aclose()
+            pool.shutdown(cancel_futures=True)
+    if args.retry_errors:
+        dropped = compact_output(args.output)
+        if dropped:
+            logging.info(f"Compacted {args.output}: dropped {dropped} superseded records.")
+    progress.report()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match a JSONL roster of NGO websites against the grant catalog.")
+    parser.add_argument("input", help="JSONL file of NGO records ({'url': ..., 'id': ...}) or URLs")
+    parser.add_argument("output", help="JSONL results file; also used to resume an interrupted run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent website fetches")
+    parser.add_argument("--per-host", type=int, default=4, help="Concurrent connections per host")
+    parser.add_argument("--top-k", type=int, default=20, help="Eligible grants kept per NGO")
+    parser.add_argument("--include-ineligible", action="store_true", help="Also write ineligible grants with reasons")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-run records whose previous result was an error")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between throughput reports")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: IVF candidate retrieval (ann_index.AnnIndex) vs exact brute-force cosine search.
+
+Builds a synthetic catalog of normalized 384-d vectors (the all-MiniLM-L6-v2 size) drawn around topic
+centers, then reports recall@k against exact float32 search, median query latency and the size
+of the stored vectors for each quantization and nprobe.
+
+    python benchmarks/bench_ann.py [--grants 100000] [--queries 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from ann_index import QUANTIZATIONS, AnnIndex
+
+DIM = 384
+
+
+def make_vectors(count: int, centers: np.ndarray, rng: np.random.Generator, noise: float = 0.5) -> np.ndarray:
+    vectors = centers[rng.integers(0, len(centers), count)] + noise * rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, rows=None) -> np.ndarray:
+    candidates = np.arange(len(vectors)) if rows is None else rows
+    scores = (vectors if rows is None else vectors[rows]) @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return candidates[top[np.argsort(-scores[top])]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--grants", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--k", default="10,100,300", help="Comma-separated result sizes")
+    parser.add_argument("--nprobe", default="4,8,16,32,64", help="Comma-separated lists probed per query")
+    parser.add_argument("--filtered", type=float, default=0.3,
+                        help="Fraction of grants passing a simulated eligibility pre-filter (0 to skip)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Grants and NGO queries are drawn around the same topic centers.
+    centers = rng.standard_normal((args.topics, DIM)).astype(np.float32)
+    vectors = make_vectors(args.grants, centers, rng)
+    queries = make_vectors(args.queries, centers, rng)
+    ks = [int(value) for value in args.k.split(",")]
+    allowed = np.sort(rng.choice(args.grants, int(args.grants * args.filtered), replace=False)) if args.filtered else None
+
+    start = time.perf_counter()
+    exact = {k: [exact_top_k(vectors, query, k) for query in queries] for k in ks}
+    brute_ms = (time.perf_counter() - start) / (len(queries) * len(ks)) * 1000
+    exact_filtered = [exact_top_k(vectors, query, max(ks), allowed) for query in queries] if allowed is not None else None
+    print(f"{args.grants} grants, {args.queries} queries; brute force float32: {brute_ms:.2f} ms/query, "
+          f"{vectors.nbytes / 2 ** 20:.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as root:
+        for quantization in QUANTIZATIONS:
+            start = time.perf_counter()
+            index = AnnIndex.build(root, f"bench-{quantization}", vectors, quantization)
+            build_s = time.perf_counter() - start
+            stored = sum(os.path.getsize(os.path.join(index.directory, name)) for name in os.listdir(index.directory))
+            print(f"\n{quantization}: built in {build_s:.1f}s, {len(index.centroids)} lists, "
+                  f"{stored / 2 ** 20:.1f} MiB on disk (memory-mapped)")
+            header = "".join(f"  recall@{k:<5}" for k in ks)
+            print(f"{'nprobe':>7}{header}  {'median ms':>9}" + ("  filtered recall" if allowed is not None else ""))
+            for nprobe in (int(value) for value in args.nprobe.split(",")):
+                index.nprobe = nprobe
+                recalls, times = {k: [] for k in ks}, []
+                for position, query in enumerate(queries):
+                    begin = time.perf_counter()
+                    found = index.search(query, max(ks))
+                    times.append(time.perf_counter() - begin)
+                    for k in ks:
+                        recalls[k].append(len(np.intersect1d(found[:k], exact[k][position])) / k)
+                line = "".join(f"  {statistics.mean(recalls[k]):<12.3f}" for k in ks)
+                filtered = ""
+                if allowed is not None:
+                    hits = [len(np.intersect1d(index.search(query, max(ks), allowed), exact_filtered[position]))
+                            / max(ks) for position, query in enumerate(queries)]
+                    filtered = f"  {statistics.mean(hits):.3f}"
+                print(f"{nprobe:>7}{line}  {statistics.median(times) * 1000:>9.2f}{filtered}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: streaming HTML-to-text extraction vs the previous BeautifulSoup path.
+
+Builds synthetic NGO pages of increasing size (inline scripts, styles and data-URI images around
+program text) and reports median time and peak traced memory for each extractor.
+
+    python benchmarks/bench_html_extract.py [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from config import MAX_TEXT_LENGTH
+from html_extract import etree, extract_text
+
+WORDS = ("youth education health community water sanitation women girls training rural program "
+         "support partners kenya uganda livelihoods climate resilience nutrition school clinic").split()
+
+
+def make_page(size_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = ["<html><head><title>Example NGO</title><style>", "body{margin:0}" * 2000, "</style></head><body>",
+             "<nav>" + " ".join(f"<a href='/p{i}'>Menu {i}</a>" for i in range(200)) + "</nav>"]
+    size = sum(len(part) for part in parts)
+    while size < size_bytes:
+        if rng.random() < 0.3:
+            block = "<script>var data=" + repr([rng.random() for _ in range(2000)]) + ";</script>"
+        elif rng.random() < 0.2:
+            block = "<img src='data:image/png;base64," + "A" * 20000 + "'>"
+        else:
+            block = "<p>" + " ".join(rng.choice(WORDS) for _ in range(120)) + "</p>"
+        parts.append(block)
+        size += len(block)
+    parts.append("<footer>Copyright Example NGO</footer></body></html>")
+    return "".join(parts)
+
+
+def beautifulsoup_extract(html: str, max_length: int) -> str:
+    """The extraction path the fetcher used before streaming: full parse, strip, then truncate."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "header", "footer", "nav", "aside", "form"]):
+        tag.extract()
+    return soup.get_text(separator=" ", strip=True)[:max_length]
+
+
+def measure(func, html: str, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default="100000,1000000,5000000", help="Comma-separated page sizes in bytes")
+    args = parser.parse_args()
+
+    extractors = {"beautifulsoup": lambda html: beautifulsoup_extract(html, MAX_TEXT_LENGTH),
+                  "stream/html.parser": lambda html: extract_text(html, MAX_TEXT_LENGTH, backend="html.parser")}
+    if etree is not None:
+        extractors["stream/lxml"] = lambda html: extract_text(html, MAX_TEXT_LENGTH, backend="lxml")
+
+    print(f"{'page size':>10}  {'extractor':<20} {'median ms':>10} {'peak MiB':>9}  same text")
+    for size in (int(value) for value in args.sizes.split(",")):
+        html = make_page(size)
+        baseline = None
+        for name, func in extractors.items():
+            seconds, peak, text = measure(func, html, args.repeat)
+            baseline = text if baseline is None else baseline
+            print(f"{len(html):>10}  {name:<20} {seconds * 1000:>10.1f} {peak / 2 ** 20:>9.1f}  {text == baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Benchmark: matcher latency, throughput, memory and model calls on synthetic catalogs.
+
+Each catalog size (10, 1000 and 100000 grants by default, in the GRANTS schema) runs in a fresh worker
+process with its own working directory, so caches, the catalog and peak RSS start from zero. The worker
+serves synthetic NGO pages of several sizes from a local HTTP stub and measures:
+  - index build time (set_grants)
+  - extract_text_from_url_async with a cold and a warm HTTP cache, preprocess_text, analyze_website_text,
+    match_grant (per grant, on a sample) and match_website
+  - the "/" route end to end, one request at a time and with concurrent clients (requests/s),
+    with the per-stage breakdown from metrics.profiled()
+  - sentence-model encode calls and texts encoded, per phase
+  - peak RSS of the worker
+
+Nothing touches the network. --models real uses the configured models, which must already be
+downloaded; --models stub swaps in a hashing encoder of the same dimension and leaves spaCy out, so
+text goes through the regex fallback; --models auto (the default) uses the real models when they
+load offline and the stand-ins otherwise. The results record which one ran.
+
+Results are written as JSON (default benchmarks/results/matcher-<commit>.json); compare two runs with
+--compare, which prints new/old for every number.
+
+    python benchmarks/bench_matcher.py [--sizes 10,1000,100000] [--pages 5000,50000,500000] [--repeat 5]
+    python benchmarks/bench_matcher.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+FOCUS_AREAS = ["Education", "Healthcare", "Water and Sanitation", "Climate Resilience", "Agriculture",
+               "Livelihoods", "Nutrition", "Gender Equality", "Disaster Relief", "Vocational Training",
+               "Human Rights", "Clean Energy", "Community Health", "Digital Literacy", "Peacebuilding"]
+POPULATIONS = ["Youth", "Women", "Girls", "Children", "Refugees", "Smallholder farmers", "Rural communities",
+               "People with disabilities", "Older people", "Urban poor", "Indigenous communities"]
+REGIONS = ["Kenya", "Uganda", "Tanzania", "Rwanda", "Ethiopia", "Nigeria", "Ghana", "India", "Bangladesh",
+           "Nepal", "Peru", "Guatemala", "Philippines", "East Africa", "West Africa", "South Asia",
+           "Latin America", "Sub-Saharan Africa", "Global"]
+FILLER = ("program support partners community local capacity sustainable impact project families "
+          "training access services improve outcomes strengthen network volunteers donors annual report").split()
+
+
+# ----- synthetic data -----
+
+def make_grant(number: int, rng: random.Random, today: datetime) -> dict:
+    focus = rng.sample(FOCUS_AREAS, rng.randint(1, 4))
+    populations = rng.sample(POPULATIONS, rng.randint(1, 3))
+    regions = rng.sample(REGIONS, rng.randint(1, 3))
+    roll = rng.random()
+    if roll < 0.8:
+        deadline = (today + timedelta(days=rng.randint(1, 720))).strftime("%Y-%m-%d")
+    elif roll < 0.95:
+        deadline = (today - timedelta(days=rng.randint(1, 720))).strftime("%Y-%m-%d")
+    else:
+        deadline = "rolling"
+    min_budget = rng.choice([None, 10000, 50000, 100000, 300000])
+    max_budget = rng.choice([None, 200000, 500000, 1000000, 5000000])
+    filler = " ".join(rng.choice(FILLER) for _ in range(rng.randint(20, 80)))
+    return {
+        "title": f"{focus[0]} Grant for {populations[0]} in {regions[0]} #{number}",
+        "description": f"Funding for organizations working on {', '.join(focus).lower()} with "
+                       f"{', '.join(populations).lower()} in {', '.join(regions)}. {filler}",
+        "application_deadline": deadline,
+        "focus_areas": focus,
+        "target_beneficiaries_focus": populations,
+        "eligibility_criteria_text": f"Registered NGOs operating in {' or '.join(regions)}. "
+                                     f"Minimum {rng.randint(1, 5)} years of experience.",
+        "geographic_eligibility": regions,
+        "min_budget": min_budget,
+        "max_budget": max_budget,
+        "link": f"https://grants.example.org/{number}",
+        "keywords": [word.lower() for word in focus + populations][:6],
+    }
+
+
+def make_catalog(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    today = datetime.now()
+    return [make_grant(number, rng, today) for number in range(size)]
+
+
+def make_page(size_bytes: int, seed: int) -> str:
+    """An NGO home page of about size_bytes: navigation, a script and style block, then program text."""
+    rng = random.Random(seed)
+    region, focus, population = rng.choice(REGIONS[:-1]), rng.choice(FOCUS_AREAS), rng.choice(POPULATIONS)
+    parts = [f"<html><head><title>NGO {seed}</title><style>", "p{margin:0}" * 200, "</style></head><body>",
+             "<nav>" + " ".join(f"<a href='/p{i}'>Menu {i}</a>" for i in range(50)) + "</nav>",
+             f"<h1>We support {population.lower()} in {region} through {focus.lower()}</h1>",
+             "<script>var data=" + repr([round(rng.random(), 4) for _ in range(500)]) + ";</script>"]
+    size = sum(len(part) for part in parts)
+    while size < size_bytes:
+        words = [rng.choice(FILLER) for _ in range(80)]
+        for vocabulary in (FOCUS_AREAS, POPULATIONS, REGIONS[:-1]):
+            words.insert(rng.randrange(len(words)), rng.choice(vocabulary).lower())
+        block = "<p>" + " ".join(words) + ".</p>"
+        parts.append(block)
+        size += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves /ngo/<bytes>/<seed> as a cacheable synthetic NGO page."""
+
+    def do_GET(self):
+        try:
+            _, _, size, seed = self.path.split("?")[0].split("/")
+            body = make_page(int(size), int(seed)).encode("utf-8")
+        except ValueError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# ----- model stand-ins -----
+
+class HashingEncoder:
+    """Offline stand-in for SentenceTransformer: a normalized bag of hashed words, same output shape."""
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        vectors = np.zeros((1 if single else len(sentences), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate([sentences] if single else sentences):
+            columns = [zlib.crc32(word.encode("utf-8")) % EMBEDDING_DIM for word in str(text).lower().split()]
+            vectors[row] = np.bincount(columns, minlength=EMBEDDING_DIM)
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+class CountingEncoder:
+    """Wraps a sentence model and counts encode calls and texts encoded."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def encode(self, sentences, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.texts += 1 if isinstance(sentences, str) else len(sentences)
+        return self.model.encode(sentences, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def snapshot(self) -> tuple:
+        return self.calls, self.texts
+
+
+def bench_models(mode: str):
+    """A ModelRegistry for main.MODELS that counts encode calls, with stand-ins when mode asks for them."""
+    from config import SENTENCE_MODEL_NAME, SPACY_MODEL_NAME
+    from models import ModelRegistry
+
+    class BenchModels(ModelRegistry):
+        stand_in = mode == "stub"
+
+        def _load_sentence_model(self):
+            model = HashingEncoder() if self.stand_in else super()._load_sentence_model()
+            return CountingEncoder(model) if model is not None else None
+
+        def _load_spacy(self):
+            return None if self.stand_in else super()._load_spacy()
+
+    registry = BenchModels(SENTENCE_MODEL_NAME, SPACY_MODEL_NAME)
+    if mode == "auto":
+        status = (registry.load(), registry.status())[1]
+        if status["sentence_model"] != "loaded" or status["nlp"] != "loaded":
+            registry = bench_models("stub")
+    return registry
+
+
+# ----- measurement -----
+
+def latency(seconds: list) -> dict:
+    ordered = sorted(seconds)
+    return {"runs": len(ordered), "median_ms": round(statistics.median(ordered) * 1000, 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+            "min_ms": round(ordered[0] * 1000, 3)}
+
+
+def peak_rss_mib() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def run_worker(args) -> dict:
+    """Runs every measurement for one catalog size; expects to be in a fresh process and directory."""
+    import logging
+
+    import main
+    from metrics import profiled
+
+    logging.disable(logging.WARNING)
+    main.MODELS = bench_models(args.models)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    seeds = iter(range(1, 10 ** 9))
+
+    encoder = main.MODELS.sentence_model
+    model_calls = {}
+
+    def counted(phase: str, func, *call_args, **call_kwargs):
+        before = encoder.snapshot() if encoder else (0, 0)
+        result = func(*call_args, **call_kwargs)
+        after = encoder.snapshot() if encoder else (0, 0)
+        calls, texts = model_calls.get(phase, (0, 0))
+        model_calls[phase] = (calls + after[0] - before[0], texts + after[1] - before[1])
+        return result
+
+    start = time.perf_counter()
+    counted("startup", main.ensure_ready)
+    startup_seconds = time.perf_counter() - start
+
+    catalog = make_catalog(args.size)
+    start = time.perf_counter()
+    counted("index_build", main.set_grants, catalog)
+    main.wait_for_refit()
+    build_seconds = time.perf_counter() - start
+    rss_after_build = peak_rss_mib()
+
+    sample = main.SNAPSHOT.index.entries[:args.grant_sample]
+    pages = {}
+    for page_bytes in args.pages:
+        timings = {name: [] for name in ("extract_text_from_url_async_cold", "extract_text_from_url_async_cached",
+                                         "match_website", "preprocess_text", "analyze_website_text_cached",
+                                         "match_grant_per_grant", "index_route")}
+        stages = {}
+        for _ in range(args.repeat):
+            url = f"{base_url}/ngo/{page_bytes}/{next(seeds)}"
+            for name in ("extract_text_from_url_async_cold", "extract_text_from_url_async_cached"):
+                start = time.perf_counter()
+                text = main.extract_text_from_url(url)
+                timings[name].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            counted("match_website", main.match_website, text)
+            timings["match_website"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            main.preprocess_text(text)
+            timings["preprocess_text"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            analysis = main.analyze_website_text(text)
+            timings["analyze_website_text_cached"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for entry in sample:
+                counted("match_grant", main.match_grant, text, analysis, entry.grant, entry)
+            timings["match_grant_per_grant"].append((time.perf_counter() - start) / max(len(sample), 1))
+
+            client = main.app.test_client()
+            with profiled() as profile:
+                start = time.perf_counter()
+                response = counted("index_route", client.post, "/", data={"url": f"{base_url}/ngo/{page_bytes}/{next(seeds)}"})
+                timings["index_route"].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"/ answered {response.status_code}")
+            for row in profile.as_dict()["stages"]:
+                stages.setdefault(row["stage"], []).append(row["seconds"])
+
+        def post_fresh(_):
+            main.app.test_client().post("/", data={"url": f"{base_url}/ngo/{page_bytes}/{next(seeds)}"})
+
+        requests = args.concurrency * args.repeat
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(post_fresh, range(requests)))
+        throughput = requests / (time.perf_counter() - start)
+
+        pages[str(page_bytes)] = {
+            "text_chars": len(text),
+            "latency": {name: latency(values) for name, values in timings.items()},
+            "index_route_stages_ms": {name: round(statistics.median(values) * 1000, 3)
+                                      for name, values in stages.items()},
+            "throughput_rps": {"concurrency": args.concurrency, "requests": requests, "value": round(throughput, 2)},
+        }
+
+    server.shutdown()
+    return {
+        "grants": args.size,
+        "indexed_grants": len(main.SNAPSHOT.index),
+        "ann_index": main.SNAPSHOT.index.ann is not None,
+        "startup_seconds": round(startup_seconds, 3),
+        "index_build_seconds": round(build_seconds, 3),
+        "peak_rss_mib": {"after_build": rss_after_build, "end": peak_rss_mib()},
+        "model_calls": {phase: {"encode_calls": calls, "texts_encoded": texts}
+                        for phase, (calls, texts) in model_calls.items()},
+        "models": "stub" if getattr(main.MODELS, "stand_in", False) else "real",
+        "pages": pages,
+    }
+
+
+# ----- reporting -----
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as handle:
+        old = json.load(handle)
+    with open(new_path) as handle:
+        new = json.load(handle)
+    print(f"old: {old.get('commit')} ({old.get('models')})  new: {new.get('commit')} ({new.get('models')})")
+    old_flat, new_flat = flatten(old["catalogs"]), flatten(new["catalogs"])
+    print(f"{'metric':<90} {'old':>12} {'new':>12} {'new/old':>8}")
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[key], new_flat[key]
+        ratio = f"{after / before:.2f}" if before else "-"
+        print(f"{key:<90} {before:>12g} {after:>12g} {ratio:>8}")
+
+
+def print_summary(results: dict):
+    print(f"commit {results['commit']}, models: {results['models']}")
+    for size, catalog in results["catalogs"].items():
+        print(f"\n{size} grants: build {catalog['index_build_seconds']:.2f}s, peak RSS {catalog['peak_rss_mib']['end']} MiB, "
+              f"encode calls {json.dumps(catalog['model_calls'])}")
+        print(f"{'page bytes':>10} {'fetch cold':>11} {'fetch hit':>10} {'match_website':>14} {'match_grant':>12} "
+              f"{'route':>9} {'req/s':>8}")
+        for page_bytes, page in catalog["pages"].items():
+            timings = page["latency"]
+            print(f"{page_bytes:>10} {timings['extract_text_from_url_async_cold']['median_ms']:>9.2f}ms "
+                  f"{timings['extract_text_from_url_async_cached']['median_ms']:>8.2f}ms "
+                  f"{timings['match_website']['median_ms']:>12.2f}ms {timings['match_grant_per_grant']['median_ms']:>10.3f}ms "
+                  f"{timings['index_route']['median_ms']:>7.2f}ms {page['throughput_rps']['value']:>8.1f}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000", help="Comma-separated catalog sizes")
+    parser.add_argument("--pages", default="5000,50000,500000", help="Comma-separated NGO page sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh pages measured per page size")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients for the throughput run")
+    parser.add_argument("--grant-sample", type=int, default=100, help="Grants scored one by one with match_grant")
+    parser.add_argument("--models", choices=("auto", "real", "stub"), default="auto")
+    parser.add_argument("--output", help="JSON results file (default benchmarks/results/matcher-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)  # set for worker processes
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.pages = [int(value) for value in args.pages.split(",")]
+    if args.size is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    commit = git_commit()
+    results = {"commit": commit, "created": datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+               "settings": {"pages": args.pages, "repeat": args.repeat, "concurrency": args.concurrency,
+                            "grant_sample": args.grant_sample, "models": args.models},
+               "catalogs": {}}
+    env = dict(os.environ, HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    for size in (int(value) for value in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as workdir:
+            command = [sys.executable, os.path.abspath(__file__), "--size", str(size), "--models", args.models,
+                       "--pages", ",".join(map(str, args.pages)), "--repeat", str(args.repeat),
+                       "--concurrency", str(args.concurrency), "--grant-sample", str(args.grant_sample)]
+            output = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+            if output.returncode != 0:
+                sys.stderr.write(output.stderr)
+                raise SystemExit(f"worker for {size} grants failed")
+            results["catalogs"][str(size)] = json.loads(output.stdout.strip().splitlines()[-1])
+            print(f"{size} grants done", file=sys.stderr)
+    results["models"] = ", ".join(sorted({catalog["models"] for catalog in results["catalogs"].values()}))
+
+    path = args.output or os.path.join(ROOT, "benchmarks", "results", f"matcher-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as handle:
+        json.dump(results, handle, indent=2)
+    print_summary(results)
+    print(f"\nresults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: process startup time and memory per worker.
+
+Reports, each in fresh interpreters:
+  - time to `import main` (should stay small: models load lazily)
+  - time until ready (import, load models, build the grant index, warm up)
+  - RSS, PSS and private memory per worker for N independent workers, and for N workers forked
+    from a master that called main.preload(), the way gunicorn --preload runs them
+
+Memory figures come from /proc/<pid>/smaps_rollup, so that part needs Linux.
+
+    python benchmarks/bench_startup.py [--workers 4] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+READY_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+main.warmup()
+print(time.perf_counter() - start)
+"""
+
+# Warms up, reports its pid, then waits so every worker is alive while memory is measured.
+INDEPENDENT_WORKER = """
+import os, sys
+import main
+main.warmup()
+print(os.getpid(), flush=True)
+sys.stdin.read()
+"""
+
+PREFORK_MASTER = """
+import os, sys
+import main
+main.preload()
+children = []
+for _ in range({workers}):
+    pid = os.fork()
+    if pid == 0:
+        main.warmup()
+        print(os.getpid(), flush=True)
+        sys.stdin.read()
+        os._exit(0)
+    children.append(pid)
+sys.stdin.read()
+for pid in children:
+    os.waitpid(pid, 0)
+"""
+
+
+def run_timed(snippet: str) -> float:
+    output = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def memory_kib(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {"rss": fields.get("Rss", 0), "pss": fields.get("Pss", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def measure_workers(processes: list, per_process: int) -> list:
+    """Reads per_process worker pids from each process's stdout, measures them all, then lets everything exit."""
+    pids = []
+    for process in processes:
+        for _ in range(per_process):
+            line = process.stdout.readline()
+            if not line:
+                break
+            pids.append(int(line))
+    try:
+        return [memory_kib(pid) for pid in pids]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def summarize(label: str, samples: list):
+    if not samples:
+        print(f"{label:<28} no workers reported")
+        return
+    mean = {key: statistics.mean(sample[key] for sample in samples) / 1024 for key in samples[0]}
+    print(f"{label:<28} {mean['rss']:>9.1f} {mean['pss']:>9.1f} {mean['private']:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON instead of a table")
+    args = parser.parse_args()
+
+    import_times = [run_timed(IMPORT_SNIPPET) for _ in range(args.repeat)]
+    ready_times = [run_timed(READY_SNIPPET) for _ in range(args.repeat)]
+
+    results = {"import_seconds": statistics.median(import_times), "ready_seconds": statistics.median(ready_times)}
+    if os.path.exists("/proc/self/smaps_rollup"):
+        pipes = dict(cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        independent = [subprocess.Popen([sys.executable, "-c", INDEPENDENT_WORKER], **pipes)
+                       for _ in range(args.workers)]
+        results["independent"] = measure_workers(independent, 1)
+        master = subprocess.Popen([sys.executable, "-c", PREFORK_MASTER.format(workers=args.workers)], **pipes)
+        results["preforked"] = measure_workers([master], args.workers)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"import main:   {results['import_seconds']:.2f}s (median of {args.repeat})")
+    print(f"time to ready: {results['ready_seconds']:.2f}s (median of {args.repeat})")
+    if "independent" in results:
+        print(f"\nper worker, MiB ({args.workers} workers) {'RSS':>9} {'PSS':>9} {'private':>12}")
+        summarize("independent processes", results["independent"])
+        summarize("forked after preload()", results["preforked"])
+    else:
+        print("\nper-worker memory needs /proc/<pid>/smaps_rollup (Linux); skipped.")
+
+
+if __name__ == "__main__":
+    main()
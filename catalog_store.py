@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dedup import simhash
+from grant_index import grant_hash, parse_deadline
+
+# AUTOINCREMENT so a deleted grant's id is never handed to another grant while a process still maps it.
+GRANTS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE NOT NULL,
+    data TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    deadline REAL,
+    min_budget REAL,
+    max_budget REAL,
+    has_geo INTEGER NOT NULL,
+    geo_open INTEGER NOT NULL,
+    has_unknown_geo INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+)"""
+
+SCHEMA = GRANTS_TABLE.format(name="grants") + """;
+CREATE TABLE IF NOT EXISTS grant_geo (
+    grant_id INTEGER NOT NULL REFERENCES grants(id) ON DELETE CASCADE,
+    tag TEXT,
+    phrase TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grant_fingerprints (
+    grant_id INTEGER PRIMARY KEY REFERENCES grants(id) ON DELETE CASCADE,
+    simhash INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE INDEX IF NOT EXISTS grants_deadline ON grants(deadline);
+DROP INDEX IF EXISTS grants_min_budget;
+DROP INDEX IF EXISTS grants_max_budget;
+CREATE INDEX IF NOT EXISTS grants_min_budget_deadline ON grants(min_budget, deadline);
+CREATE INDEX IF NOT EXISTS grants_max_budget_deadline ON grants(max_budget, deadline, min_budget);
+CREATE INDEX IF NOT EXISTS grant_geo_tag ON grant_geo(tag);
+CREATE INDEX IF NOT EXISTS grant_geo_phrase ON grant_geo(phrase);
+CREATE INDEX IF NOT EXISTS grant_geo_grant ON grant_geo(grant_id);
+"""
+
+# Grants that can pass eligibility, in one indexed query. The geography clause is deliberately
+# conservative: anything the exact check in score_grants could still accept is kept.
+ELIGIBLE_QUERY = """
+SELECT id FROM grants
+WHERE deadline >= :now
+  AND (min_budget IS NULL OR min_budget <= :budget)
+  AND (max_budget IS NULL OR max_budget >= :budget)
+  AND (:skip_geo OR has_geo = 0 OR geo_open = 1 OR has_unknown_geo = 1
+       OR id IN (SELECT grant_id FROM grant_geo
+                 WHERE tag IN (SELECT value FROM json_each(:tags))
+                    OR phrase IN (SELECT value FROM json_each(:phrases))))
+ORDER BY id
+"""
+
+# How many grants the deadline and budget rules remove, each from an index range; a grant is counted
+# under the first rule it fails, in the order deadline, budget. What remains is removed by geography.
+FILTERED_COUNTS_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM grants),
+    (SELECT COUNT(*) FROM grants WHERE deadline IS NULL),
+    (SELECT COUNT(*) FROM grants WHERE deadline < :now),
+    (SELECT COUNT(*) FROM grants WHERE min_budget > :budget AND deadline >= :now),
+    (SELECT COUNT(*) FROM grants WHERE max_budget < :budget AND deadline >= :now
+                                   AND (min_budget IS NULL OR min_budget <= :budget))
+"""
+
+
+def grant_key(grant: dict) -> str:
+    """Stable identity of a grant across loads: its link, or its title when it has none."""
+    return grant.get("link") or grant.get("title", "")
+
+
+def grant_fingerprint(grant: dict) -> int:
+    """SimHash of the title and description, used to spot the same grant listed by several sources."""
+    return simhash(f"{grant.get('title', '')} {grant.get('description', '')}")
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class GrantCatalog:
+    """
+    Persistent grant catalog in SQLite, indexed on deadline, budgets and normalized geography tags
+    so most ineligible grants are dropped before any scoring.
+
+    Geography is stored per location as the gazetteer tag (see geo.GeoResolver) and the preprocessed
+    phrase that score_grants substring-matches against the website. version increases on every
+    change, so caches derived from the catalog can key on it.
+    """
+
+    def __init__(self, path: str, preprocess, geo_resolver):
+        self.path = path
+        self.preprocess = preprocess
+        self.geo_resolver = geo_resolver
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._phrases = (None, [])
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._pid = os.getpid()
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate(self._conn)
+            with self._conn:
+                self._conn.executescript(SCHEMA)
+            self._conn.execute("PRAGMA foreign_keys=ON")
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """Recreates a grants table from before AUTOINCREMENT; runs before foreign keys are enforced, so nothing cascades."""
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'grants'").fetchone()
+        if row is None or "AUTOINCREMENT" in row[0].upper():
+            return
+        conn.executescript(f"""
+            BEGIN IMMEDIATE;
+            {GRANTS_TABLE.format(name="grants_migrated")};
+            INSERT INTO grants_migrated SELECT * FROM grants;
+            DROP TABLE grants;
+            ALTER TABLE grants_migrated RENAME TO grants;
+            COMMIT;
+        """)
+        logging.info("Grant catalog migrated to AUTOINCREMENT ids.")
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM grants").fetchone()[0]
+
+    # ----- writes -----
+
+    def upsert(self, grants: list) -> list:
+        """Inserts new grants and updates changed ones; unchanged grants are skipped. Returns the changed keys."""
+        changed = []
+        with self._lock, self.conn:
+            existing = dict(self.conn.execute("SELECT key, content_hash FROM grants"))
+            for grant in grants:
+                key, digest = grant_key(grant), grant_hash(grant)
+                if existing.get(key) == digest:
+                    continue
+                self._write(key, digest, grant)
+                existing[key] = digest
+                changed.append(key)
+            if changed:
+                self._bump_version()
+        if changed:
+            logging.info(f"Grant catalog: {len(changed)} grants inserted or updated.")
+        return changed
+
+    def seed(self, grants: list) -> list:
+        """Writes grants into a catalog that has never been written to; a catalog with any history is left alone."""
+        if self.version:
+            return []
+        return self.upsert(grants)
+
+    def replace(self, grants: list) -> list:
+        """Makes the catalog exactly grants: upserts them and deletes every other grant."""
+        changed = self.upsert(grants)
+        keep = {grant_key(grant) for grant in grants}
+        with self._lock, self.conn:
+            stale = [key for (key,) in self.conn.execute("SELECT key FROM grants") if key not in keep]
+            self.conn.executemany("DELETE FROM grants WHERE key = ?", [(key,) for key in stale])
+            if stale:
+                self._bump_version()
+        return changed + stale
+
+    def delete(self, keys: list):
+        with self._lock, self.conn:
+            deleted = self.conn.executemany("DELETE FROM grants WHERE key = ?", [(key,) for key in keys]).rowcount
+            if deleted:
+                self._bump_version()
+
+    def _write(self, key: str, digest: str, grant: dict):
+        locations = grant.get("geographic_eligibility", []) or []
+        phrases = [self.preprocess(location) for location in locations]
+        # Resolve the preprocessed phrase, as GeoResolver does at scoring time, so both sides agree.
+        tags = [self.geo_resolver.resolve(phrase) for phrase in phrases]
+        deadline = parse_deadline(grant.get("application_deadline"))
+        row = (
+            json.dumps(grant), digest,
+            deadline.timestamp() if deadline else None,
+            grant.get("min_budget"), grant.get("max_budget"),
+            int(bool(phrases)),
+            int("global" in phrases or "worldwide" in phrases),
+            int(any(tag is None for tag in tags)),
+            time.time(),
+        )
+        self.conn.execute(
+            """INSERT INTO grants (key, data, content_hash, deadline, min_budget, max_budget,
+                                   has_geo, geo_open, has_unknown_geo, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET data = excluded.data, content_hash = excluded.content_hash,
+                   deadline = excluded.deadline, min_budget = excluded.min_budget, max_budget = excluded.max_budget,
+                   has_geo = excluded.has_geo, geo_open = excluded.geo_open,
+                   has_unknown_geo = excluded.has_unknown_geo, updated_at = excluded.updated_at""",
+            (key,) + row)
+        grant_id = self.conn.execute("SELECT id FROM grants WHERE key = ?", (key,)).fetchone()[0]
+        self.conn.execute("DELETE FROM grant_geo WHERE grant_id = ?", (grant_id,))
+        self.conn.executemany("INSERT INTO grant_geo (grant_id, tag, phrase) VALUES (?, ?, ?)",
+                              [(grant_id, tag, phrase) for tag, phrase in zip(tags, phrases)])
+        self.conn.execute("INSERT OR REPLACE INTO grant_fingerprints (grant_id, simhash) VALUES (?, ?)",
+                          (grant_id, _to_signed(grant_fingerprint(grant))))
+
+    def _bump_version(self):
+        self.conn.execute("""INSERT INTO meta (key, value) VALUES ('version', '1')
+                             ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""")
+
+    # ----- reads -----
+
+    def load(self):
+        """Returns (ids, grants) for the whole catalog in id order."""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, data FROM grants ORDER BY id").fetchall()
+        return [grant_id for grant_id, _ in rows], [json.loads(data) for _, data in rows]
+
+    def keys(self) -> set:
+        with self._lock:
+            return {key for (key,) in self.conn.execute("SELECT key FROM grants")}
+
+    def fingerprints(self) -> list:
+        """Returns (key, simhash) for every grant, computing any missing from catalogs written before fingerprints."""
+        with self._lock, self.conn:
+            rows = self.conn.execute("""SELECT g.id, g.key, g.data, f.simhash FROM grants g
+                                        LEFT JOIN grant_fingerprints f ON f.grant_id = g.id""").fetchall()
+            result, missing = [], []
+            for grant_id, key, data, value in rows:
+                if value is None:
+                    value = _to_signed(grant_fingerprint(json.loads(data)))
+                    missing.append((grant_id, value))
+                result.append((key, value & ((1 << 64) - 1)))
+            self.conn.executemany("INSERT INTO grant_fingerprints (grant_id, simhash) VALUES (?, ?)", missing)
+        return result
+
+    def _geo_phrases(self) -> list:
+        version = self.version
+        if self._phrases[0] != version:
+            with self._lock:
+                phrases = [phrase for (phrase,) in self.conn.execute("SELECT DISTINCT phrase FROM grant_geo")]
+            self._phrases = (version, phrases)
+        return self._phrases[1]
+
+    def eligible_ids(self, now, ngo_budget: float, website_text_clean: str, ngo_locations: list) -> tuple:
+        """
+        Ids of grants that are not expired, fit the NGO budget and may match its geography, and a
+        {rule: count} of the grants each rule removed (deadline, then budget, then geography).
+        Geography uses gazetteer containment for the NGO's locations plus the same phrase-in-text test
+        as score_grants; if any NGO location is unknown to the gazetteer (so the fuzzy embedding fallback
+        could match anything), geography is left to the scorer.
+        """
+        covered, skip_geo = set(), "global" in website_text_clean or "worldwide" in website_text_clean
+        for location in ngo_locations:
+            name = self.geo_resolver.resolve(location)
+            if name is None:
+                skip_geo = True
+                break
+            covered |= self.geo_resolver.ancestors(name)
+        phrases = [] if skip_geo else [phrase for phrase in self._geo_phrases() if phrase in website_text_clean]
+        params = {
+            "now": now.timestamp(),
+            "budget": ngo_budget,
+            "skip_geo": int(skip_geo),
+            "tags": json.dumps(sorted(covered)),
+            "phrases": json.dumps(phrases),
+        }
+        with self._lock:
+            ids = [grant_id for (grant_id,) in self.conn.execute(ELIGIBLE_QUERY, params)]
+            total, *counts = self.conn.execute(FILTERED_COUNTS_QUERY, params).fetchone()
+        filtered = dict(zip(("deadline_missing", "deadline_passed", "budget_below_min", "budget_above_max"), counts))
+        filtered["geo"] = total - sum(counts) - len(ids)
+        return ids, filtered
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,2 +1,50 @@
+import os
+
 # Maximum number of characters to process from a website
-MAX_TEXT_LENGTH = 10000
+MAX_TEXT_LENGTH = 15000
+
+# Hard cap on bytes read from a website; reading stops here even if MAX_TEXT_LENGTH was not reached
+MAX_HTML_BYTES = 5 * 1024 * 1024
+
+# Where the corpus-fitted TF-IDF model for the grant catalog is persisted
+TFIDF_MODEL_PATH = "cache/tfidf_model.joblib"
+
+# SQLite file holding the HTTP revalidation cache and the extracted-text / NLP analysis cache
+FETCH_CACHE_PATH = "cache/fetch_cache.sqlite3"
+
+# JSON API: threads running NLP/scoring, and how many more requests may wait for one before we answer 503
+INFERENCE_WORKERS = 4
+INFERENCE_QUEUE_DEPTH = 32
+
+# SQLite grant catalog; seeded with the example grants in main.py on first start
+GRANT_CATALOG_PATH = "data/grants.sqlite3"
+
+# Grant ingestion (scrape_grants.py): concurrent page fetches and listing pages read per source at most
+INGEST_CONCURRENCY = 8
+INGEST_MAX_PAGES = 20
+
+# Candidate retrieval: memory-mapped grant vectors ("float16" or "int8"), lists probed per query,
+# and how many nearest grants go on to full scoring
+ANN_INDEX_DIR = "cache/ann"
+ANN_QUANTIZATION = "int8"
+ANN_NPROBE = 32
+ANN_CANDIDATES = 300
+
+# NLP models, loaded lazily by models.ModelRegistry. Downloading a missing spaCy model at runtime is opt-in.
+SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+SPACY_MODEL_NAME = "en_core_web_sm"
+SPACY_AUTO_DOWNLOAD = False
+
+# Load models and build the grant index at import, for pre-fork servers (gunicorn --preload)
+PRELOAD_MODELS = os.environ.get("NGO_PRELOAD_MODELS") == "1"
+
+# JSON API: start warming the models in the background as soon as the server starts
+WARMUP_ON_START = True
+
+# Let clients ask for a per-request stage breakdown (profile=1 on the form, "profile": true in the JSON API)
+ALLOW_REQUEST_PROFILING = True
+
+# Website embedding: the text is split into chunks that fit the sentence model's token window and
+# encoded in one batch. Grants are compared with the chunks' mean ("mean") or their best chunk ("max").
+WEBSITE_EMBEDDING_POOLING = "max"
+WEBSITE_CHUNK_OVERLAP = 32
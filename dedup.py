@@ -0,0 +1,60 @@
+import hashlib
+import re
+
+import numpy as np
+
+SIMHASH_BITS = 64
+# Grants whose fingerprints differ in at most this many bits are treated as the same grant.
+NEAR_DUPLICATE_DISTANCE = 3
+
+
+def _shingles(text: str, size: int = 3) -> list:
+    words = re.findall(r'[a-z0-9]+', str(text).lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles: similar texts get fingerprints a few bits apart."""
+    shingles = _shingles(text)
+    if not shingles:
+        return 0
+    digests = np.frombuffer(b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles),
+                            dtype=np.uint8).reshape(len(shingles), 8)
+    votes = np.unpackbits(digests, axis=1).sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """
+    Finds fingerprints within max_distance bits of a query without comparing against all of them.
+    The 64 bits are split into max_distance + 1 bands; two fingerprints that close must agree
+    exactly on at least one band, so only fingerprints sharing a band are compared.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = -(-SIMHASH_BITS // self.bands)
+        self._buckets = {}
+
+    def _keys(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(band, (fingerprint >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+    def add(self, fingerprint: int, key):
+        for band_key in self._keys(fingerprint):
+            self._buckets.setdefault(band_key, []).append((fingerprint, key))
+
+    def find(self, fingerprint: int):
+        """Returns the key of a stored near-duplicate, or None."""
+        for band_key in self._keys(fingerprint):
+            for other, key in self._buckets.get(band_key, ()):
+                if hamming(fingerprint, other) <= self.max_distance:
+                    return key
+        return None
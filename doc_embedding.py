@@ -0,0 +1,92 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+POOLING_MODES = ("mean", "max")
+
+
+@dataclass
+class DocumentEmbedding:
+    """Embeddings of one website: a row per chunk, plus their normalized mean."""
+    chunks: np.ndarray
+    mean: np.ndarray
+
+    def query(self, pooling: str) -> np.ndarray:
+        """The single mean vector for "mean" pooling; the chunk matrix for "max" (best chunk per grant)."""
+        return self.chunks if pooling == "max" else self.mean
+
+    def similarity(self, vector: np.ndarray, pooling: str) -> float:
+        return float(np.max(self.query(pooling) @ np.asarray(vector, dtype=np.float32)))
+
+
+def chunk_text(text: str, max_tokens: int, overlap: int = 0, tokenizer=None) -> list:
+    """
+    Splits text into windows of at most max_tokens tokens, consecutive windows sharing overlap tokens.
+    Windows are cut on the model tokenizer's offsets when it provides them; otherwise on whitespace,
+    assuming about four word pieces per three words.
+    """
+    spans = None
+    if tokenizer is not None:
+        try:
+            spans = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                              verbose=False)["offset_mapping"]
+        except (NotImplementedError, TypeError, KeyError, ValueError):  # slow tokenizers have no offsets
+            spans = None
+    if spans is None:
+        spans = [match.span() for match in re.finditer(r"\S+", text)]
+        max_tokens, overlap = max(1, max_tokens * 3 // 4), overlap * 3 // 4
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for first in range(0, len(spans), step):
+        last = min(first + max_tokens, len(spans)) - 1
+        chunks.append(text[spans[first][0]:spans[last][1]])
+        if last == len(spans) - 1:
+            break
+    return chunks
+
+
+class WebsiteEncoder:
+    """
+    Encodes a whole website for embedding similarity.
+
+    The sentence model only reads its first max_seq_length word pieces, so a long page encoded as one
+    string is mostly ignored yet fully tokenized. Here the text is split into windows that fit the model
+    and encoded in one batched call. Grants are then compared with the mean of the chunk vectors, or
+    with their best chunk ("max"), which lets a page that covers several programs match a grant on
+    just one of them.
+    """
+
+    def __init__(self, sentence_model, pooling: str = "max", overlap: int = 32, batch_size: int = 32):
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling {pooling!r}; expected one of {POOLING_MODES}.")
+        self.sentence_model = sentence_model
+        self.pooling = pooling
+        self.overlap = overlap
+        self.batch_size = batch_size
+        # Leave room for the [CLS] and [SEP] tokens the model adds to every chunk.
+        self.max_tokens = max(8, (getattr(sentence_model, "max_seq_length", None) or 256) - 2)
+        self.tokenizer = getattr(sentence_model, "tokenizer", None)
+        self._lock = threading.Lock()
+        self._last = (None, None)
+
+    def encode(self, text: str):
+        """The DocumentEmbedding of a preprocessed website text, or None if there is no model or no text."""
+        if self.sentence_model is None or not text or not text.strip():
+            return None
+        # match_grant asks once per grant; every call after the first for the same text is free.
+        with self._lock:
+            last_text, last_embedding = self._last
+        if last_text == text:
+            return last_embedding
+        chunks = chunk_text(text, self.max_tokens, self.overlap, self.tokenizer)
+        vectors = np.asarray(self.sentence_model.encode(chunks, normalize_embeddings=True, batch_size=self.batch_size,
+                                                        show_progress_bar=False), dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        embedding = DocumentEmbedding(chunks=vectors, mean=mean / max(float(np.linalg.norm(mean)), 1e-12))
+        logging.debug(f"Encoded website text as {len(chunks)} chunks of up to {self.max_tokens} tokens.")
+        with self._lock:
+            self._last = (text, embedding)
+        return embedding
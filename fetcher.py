@@ -0,0 +1,314 @@
+import asyncio
+import atexit
+import codecs
+import email.utils
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import aiohttp
+
+from html_extract import StreamingTextExtractor
+from metrics import CACHE_EVENTS, FETCH_ERRORS, record_stage, stage
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _freshness_lifetime(headers, now: float) -> float:
+    """Seconds a response may be served without revalidation, following Cache-Control, then Expires, then a Last-Modified heuristic."""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-cache" in cache_control or "must-revalidate" in cache_control:
+        return 0.0
+    max_age = re.search(r'(?:s-maxage|max-age)\s*=\s*(\d+)', cache_control)
+    if max_age:
+        return float(max_age.group(1))
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            return 0.0
+    last_modified = headers.get("Last-Modified")
+    if last_modified:
+        try:
+            age = now - email.utils.parsedate_to_datetime(last_modified).timestamp()
+            return min(max(0.0, age * 0.1), 86400.0)
+        except (TypeError, ValueError):
+            return 0.0
+    return 0.0
+
+
+class CacheStore:
+    """
+    Small SQLite store shared by the fetcher and the NLP layer.
+    http_cache holds validators (ETag/Last-Modified) and freshness per URL plus the hash of the body;
+    content_cache holds derived values (extracted text, spaCy analysis) keyed by content hash, so an
+    unchanged page never gets parsed twice.
+    """
+
+    def __init__(self, path: str, max_content_entries: int = 20000):
+        self.path = path
+        self.max_content_entries = max_content_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+        self._pid = None
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._pid = os.getpid()
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""CREATE TABLE IF NOT EXISTS http_cache (
+                    url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, expires_at REAL, body_hash TEXT)""")
+                self._conn.execute("""CREATE TABLE IF NOT EXISTS content_cache (
+                    namespace TEXT, key TEXT, value BLOB, accessed_at REAL, PRIMARY KEY (namespace, key))""")
+        return self._conn
+
+    def get_http(self, url: str):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, expires_at, body_hash FROM http_cache WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "expires_at": row[2], "body_hash": row[3]}
+
+    def set_http(self, url: str, etag, last_modified, expires_at: float, body_hash: str):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?)",
+                              (url, etag, last_modified, expires_at, body_hash))
+
+    def delete_http(self, url: str):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM http_cache WHERE url = ?", (url,))
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM content_cache WHERE namespace = ? AND key = ?",
+                                    (namespace, key)).fetchone()
+            if row is not None:
+                with self.conn:
+                    self.conn.execute("UPDATE content_cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                                      (time.time(), namespace, key))
+        return None if row is None else row[0]
+
+    def set(self, namespace: str, key: str, value):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO content_cache VALUES (?, ?, ?, ?)",
+                              (namespace, key, value, time.time()))
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self.conn.execute("""DELETE FROM content_cache WHERE rowid IN (
+                    SELECT rowid FROM content_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""",
+                                  (self.max_content_entries,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SiteFetcher:
+    """
+    Long-lived website fetcher. Keeps one pooled aiohttp session per event loop (keep-alive, DNS cache,
+    per-host connection limits) and consults the CacheStore so repeated URLs are answered from cache,
+    revalidated with a conditional request, or at worst re-downloaded without being re-parsed.
+
+    Synchronous callers go through fetch_text(), which runs on a background event loop owned by the
+    fetcher instead of creating a new loop per call. CacheStore reads and writes are SQLite disk I/O,
+    so they run in worker threads rather than on the event loop.
+    """
+
+    def __init__(self, cache: CacheStore, max_text_length: int, max_bytes: int, timeout: float = 15,
+                 pool_size: int = 100, per_host: int = 8, keepalive: float = 60):
+        self.cache = cache
+        self.max_text_length = max_text_length
+        self.max_bytes = max_bytes
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self.per_host = per_host
+        self.keepalive = keepalive
+        self._sessions = {}
+        self._loop = None
+        self._thread = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.per_host,
+                                             ttl_dns_cache=300, keepalive_timeout=self.keepalive)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                            headers={'User-Agent': USER_AGENT})
+            self._sessions[loop] = session
+        return session
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._pid != os.getpid():
+                # After a fork the parent's loop thread does not exist here, and its pooled
+                # connections must not be shared; start over in this process.
+                self._loop, self._thread, self._sessions = None, None, {}
+                self._pid = os.getpid()
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="site-fetcher", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def fetch_text(self, url: str) -> str:
+        """Synchronous entry point; runs fetch_text_async on the fetcher's own event loop."""
+        future = asyncio.run_coroutine_threadsafe(self.fetch_text_async(url), self._background_loop())
+        return future.result()
+
+    async def fetch_text_async(self, url: str) -> str:
+        """
+        Returns the visible text of a page, or a user-facing "Error: ..." message.
+        Fresh cache entries are served without touching the network; stale ones are revalidated.
+        """
+        try:
+            with stage("fetch"):
+                return await self._fetch_text(url)
+        except asyncio.TimeoutError:
+            FETCH_ERRORS.inc(type="timeout")
+            logging.error(f"Timeout error fetching URL: {url}")
+            return "Error: Request to the website timed out. The website might be slow or unresponsive."
+        except aiohttp.ClientResponseError as e:
+            FETCH_ERRORS.inc(type=f"http_{e.status // 100}xx")
+            logging.error(f"HTTP error {e.status} fetching URL: {url}")
+            return f"Error: Received HTTP {e.status} from the website. Check if the URL is correct or if the website is accessible."
+        except aiohttp.ClientConnectionError:
+            FETCH_ERRORS.inc(type="connection")
+            logging.error(f"Connection error fetching URL: {url}")
+            return "Error: Could not connect to the website. Please check the URL or your internet connection."
+        except Exception as e:
+            FETCH_ERRORS.inc(type="unexpected")
+            logging.error(f"An unexpected error occurred during URL extraction for {url}: {e}", exc_info=True)
+            return f"Error: An unexpected issue occurred while processing the website. Please try again."
+
+    async def _fetch_text(self, url: str) -> str:
+        now = time.time()
+        cached, cached_text = await asyncio.to_thread(self._cached_response, url)
+        if cached_text is not None and cached["expires_at"] > now:
+            CACHE_EVENTS.inc(cache="http", result="hit")
+            logging.info(f"Serving {url} from HTTP cache.")
+            return cached_text
+
+        headers = {}
+        if cached_text is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._session().get(url, headers=headers) as response:
+            if response.status == 304 and cached_text is not None:
+                CACHE_EVENTS.inc(cache="http", result="revalidated")
+                await asyncio.to_thread(self.cache.set_http, url, response.headers.get("ETag", cached["etag"]),
+                                        response.headers.get("Last-Modified", cached["last_modified"]),
+                                        now + _freshness_lifetime(response.headers, now), cached["body_hash"])
+                logging.info(f"{url} not modified; reusing cached text.")
+                return cached_text
+
+            response.raise_for_status()
+            CACHE_EVENTS.inc(cache="http", result="miss")
+            text, body_hash = await self._read_text(response)
+            response_headers = response.headers
+
+        await asyncio.to_thread(self._store_response, url, response_headers, now, text, body_hash)
+        return text
+
+    async def _read_text(self, response):
+        """
+        Streams the body through the HTML extractor, stopping once enough visible text has been
+        collected or max_bytes have been read. Returns the text and a hash of the bytes consumed.
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        extractor = StreamingTextExtractor(self.max_text_length)
+        digest = hashlib.sha256()
+        size = 0
+        parse_seconds = 0.0  # parsing is interleaved with reads; only the parser's share is counted
+        async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+            chunk = chunk[:self.max_bytes - size]
+            digest.update(chunk)
+            size += len(chunk)
+            start = time.perf_counter()
+            done = extractor.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - start
+            if done or size >= self.max_bytes:
+                # Drop the rest of the body; the connection is closed rather than drained.
+                response.close()
+                break
+        else:
+            extractor.feed(decoder.decode(b"", final=True))
+        start = time.perf_counter()
+        text = extractor.close()
+        record_stage("html_parse", parse_seconds + time.perf_counter() - start)
+        return text, digest.hexdigest()
+
+    def _text_key(self, body_hash: str) -> str:
+        # Limits are part of the key so changing MAX_TEXT_LENGTH or MAX_HTML_BYTES invalidates old entries.
+        return f"{self.max_text_length}:{self.max_bytes}:{body_hash}"
+
+    def _cached_response(self, url: str):
+        """The http_cache entry for url and its cached text (either may be None). Blocking; run off the loop."""
+        cached = self.cache.get_http(url)
+        return cached, self._cached_text(cached["body_hash"]) if cached else None
+
+    def _store_response(self, url: str, headers, now: float, text: str, body_hash: str):
+        """Caches a downloaded page's text and validators. Blocking; run off the loop."""
+        self.cache.set("text", self._text_key(body_hash), text)
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            self.cache.delete_http(url)
+        else:
+            self.cache.set_http(url, headers.get("ETag"), headers.get("Last-Modified"),
+                                now + _freshness_lifetime(headers, now), body_hash)
+
+    def _cached_text(self, body_hash: str):
+        value = self.cache.get("text", self._text_key(body_hash))
+        return None if value is None else (value.decode("utf-8") if isinstance(value, bytes) else value)
+
+    async def aclose(self):
+        """Closes the pooled session bound to the running event loop; for callers that own their loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def close(self):
+        """Closes pooled sessions and stops the background loop."""
+        if self._pid != os.getpid():
+            return  # inherited through fork; the loop belongs to the parent
+        if self._loop is not None:
+            session = self._sessions.pop(self._loop, None)
+            if session is not None and not session.closed:
+                try:
+                    asyncio.run_coroutine_threadsafe(session.close(), self._loop).result(timeout=5)
+                except Exception:
+                    pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+        self._sessions.clear()
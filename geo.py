@@ -0,0 +1,307 @@
+import logging
+import re
+import threading
+
+import numpy as np
+
+GEO_FUZZY_THRESHOLD = 0.75
+
+# Gazetteer: place -> parent region(s). Every chain ends at "global".
+REGION_PARENTS = {
+    # Continents and macro-regions
+    "africa": "global",
+    "asia": "global",
+    "europe": "global",
+    "americas": "global",
+    "oceania": "global",
+    "middle east": "global",
+    "sub saharan africa": "africa",
+    "north africa": ("africa", "middle east"),
+    "east africa": "sub saharan africa",
+    "west africa": "sub saharan africa",
+    "central africa": "sub saharan africa",
+    "southern africa": "sub saharan africa",
+    "south asia": "asia",
+    "southeast asia": "asia",
+    "east asia": "asia",
+    "central asia": "asia",
+    "latin america": "americas",
+    "north america": "americas",
+    "central america": "latin america",
+    "south america": "latin america",
+    "caribbean": "latin america",
+    "western europe": "europe",
+    "eastern europe": "europe",
+    # East Africa
+    "kenya": "east africa",
+    "uganda": "east africa",
+    "tanzania": "east africa",
+    "rwanda": "east africa",
+    "burundi": "east africa",
+    "ethiopia": "east africa",
+    "somalia": "east africa",
+    "south sudan": "east africa",
+    "sudan": ("east africa", "north africa"),
+    "eritrea": "east africa",
+    "djibouti": "east africa",
+    # West Africa
+    "nigeria": "west africa",
+    "ghana": "west africa",
+    "senegal": "west africa",
+    "sierra leone": "west africa",
+    "liberia": "west africa",
+    "mali": "west africa",
+    "niger": "west africa",
+    "burkina faso": "west africa",
+    "cote d ivoire": "west africa",
+    "guinea": "west africa",
+    "togo": "west africa",
+    "benin": "west africa",
+    "gambia": "west africa",
+    # Central Africa
+    "democratic republic of the congo": "central africa",
+    "republic of the congo": "central africa",
+    "cameroon": "central africa",
+    "central african republic": "central africa",
+    "chad": "central africa",
+    "gabon": "central africa",
+    # Southern Africa
+    "south africa": "southern africa",
+    "zimbabwe": "southern africa",
+    "zambia": "southern africa",
+    "malawi": "southern africa",
+    "mozambique": "southern africa",
+    "botswana": "southern africa",
+    "namibia": "southern africa",
+    "lesotho": "southern africa",
+    "eswatini": "southern africa",
+    "madagascar": "southern africa",
+    "angola": "southern africa",
+    # North Africa
+    "egypt": "north africa",
+    "morocco": "north africa",
+    "algeria": "north africa",
+    "tunisia": "north africa",
+    "libya": "north africa",
+    # Middle East
+    "jordan": "middle east",
+    "lebanon": "middle east",
+    "syria": "middle east",
+    "iraq": "middle east",
+    "yemen": "middle east",
+    "palestine": "middle east",
+    "turkey": ("middle east", "europe"),
+    # Asia
+    "india": "south asia",
+    "pakistan": "south asia",
+    "bangladesh": "south asia",
+    "nepal": "south asia",
+    "sri lanka": "south asia",
+    "afghanistan": "south asia",
+    "indonesia": "southeast asia",
+    "philippines": "southeast asia",
+    "vietnam": "southeast asia",
+    "cambodia": "southeast asia",
+    "myanmar": "southeast asia",
+    "thailand": "southeast asia",
+    "laos": "southeast asia",
+    "china": "east asia",
+    "japan": "east asia",
+    "mongolia": "east asia",
+    # Americas
+    "united states": "north america",
+    "canada": "north america",
+    "mexico": ("north america", "latin america"),
+    "guatemala": "central america",
+    "honduras": "central america",
+    "el salvador": "central america",
+    "nicaragua": "central america",
+    "haiti": "caribbean",
+    "brazil": "south america",
+    "colombia": "south america",
+    "peru": "south america",
+    "bolivia": "south america",
+    "ecuador": "south america",
+    "venezuela": "south america",
+    "argentina": "south america",
+    "chile": "south america",
+    # Europe
+    "united kingdom": "western europe",
+    "france": "western europe",
+    "germany": "western europe",
+    "netherlands": "western europe",
+    "ukraine": "eastern europe",
+    "poland": "eastern europe",
+    # Cities
+    "nairobi": "kenya",
+    "mombasa": "kenya",
+    "kisumu": "kenya",
+    "kampala": "uganda",
+    "dar es salaam": "tanzania",
+    "kigali": "rwanda",
+    "addis ababa": "ethiopia",
+    "lagos": "nigeria",
+    "abuja": "nigeria",
+    "accra": "ghana",
+    "dakar": "senegal",
+    "kinshasa": "democratic republic of the congo",
+    "johannesburg": "south africa",
+    "cape town": "south africa",
+    "cairo": "egypt",
+    "mumbai": "india",
+    "delhi": "india",
+    "new delhi": "india",
+    "dhaka": "bangladesh",
+    "karachi": "pakistan",
+    "manila": "philippines",
+    "jakarta": "indonesia",
+    "sao paulo": "brazil",
+    "mexico city": "mexico",
+    "london": "united kingdom",
+    "new york": "united states",
+}
+
+ALIASES = {
+    "worldwide": "global",
+    "international": "global",
+    "world": "global",
+    "ssa": "sub saharan africa",
+    "subsaharan africa": "sub saharan africa",
+    "eastern africa": "east africa",
+    "western africa": "west africa",
+    "usa": "united states",
+    "us": "united states",
+    "united state": "united states",
+    "america": "united states",
+    "uk": "united kingdom",
+    "britain": "united kingdom",
+    "great britain": "united kingdom",
+    "drc": "democratic republic of the congo",
+    "dr congo": "democratic republic of the congo",
+    "congo": "republic of the congo",
+    "ivory coast": "cote d ivoire",
+    "philippine": "philippines",
+    "netherland": "netherlands",
+    "burma": "myanmar",
+    "south east asia": "southeast asia",
+    "latin american": "latin america",
+    "african": "africa",
+}
+
+
+def normalize_location(text: str) -> str:
+    """Lowercases a location and reduces punctuation to single spaces ("Sub-Saharan Africa" -> "sub saharan africa")."""
+    text = re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+    if text.startswith("the "):
+        text = text[4:]
+    return text
+
+
+class GeoResolver:
+    """
+    Decides whether a location mentioned by an NGO satisfies a grant's geographic eligibility.
+    Places in the gazetteer are matched by walking REGION_PARENTS, so an NGO in Nairobi matches grants
+    for Kenya, East Africa, Africa or Global. Anything the gazetteer does not know falls back to
+    embedding similarity, with each location string encoded at most once per process.
+    """
+
+    def __init__(self, sentence_model=None, parents: dict = None, aliases: dict = None,
+                 threshold: float = GEO_FUZZY_THRESHOLD, max_cached: int = 100000):
+        self.sentence_model = sentence_model
+        self.max_cached = max_cached
+        self.parents = REGION_PARENTS if parents is None else parents
+        self.aliases = ALIASES if aliases is None else aliases
+        self.threshold = threshold
+        self._ancestors = {}
+        self._embeddings = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, location: str):
+        """Returns the gazetteer name for a location, or None if it is unknown."""
+        name = normalize_location(location)
+        name = self.aliases.get(name, name)
+        if name == "global" or name in self.parents:
+            return name
+        return None
+
+    def ancestors(self, name: str) -> frozenset:
+        """The place itself plus every region that contains it."""
+        cached = self._ancestors.get(name)
+        if cached is not None:
+            return cached
+        found, stack = set(), [name]
+        while stack:
+            place = stack.pop()
+            if place in found:
+                continue
+            found.add(place)
+            parent = self.parents.get(place)
+            if parent:
+                stack.extend((parent,) if isinstance(parent, str) else parent)
+        result = frozenset(found)
+        self._ancestors[name] = result
+        return result
+
+    def embed(self, locations: list) -> np.ndarray:
+        """Returns normalized embeddings for location strings, encoding only those not seen before."""
+        with self._lock:
+            found = {loc: self._embeddings[loc] for loc in set(locations) if loc in self._embeddings}
+        missing = sorted(set(locations) - found.keys())
+        if missing:
+            vectors = np.asarray(self.sentence_model.encode(missing, normalize_embeddings=True), dtype=np.float32)
+            found.update(zip(missing, vectors))
+            with self._lock:
+                self._embeddings.update(zip(missing, vectors))
+                # Website entities are open-ended; drop the oldest entries once the cache is full.
+                for stale in list(self._embeddings)[:max(0, len(self._embeddings) - self.max_cached)]:
+                    del self._embeddings[stale]
+        return np.stack([found[loc] for loc in locations])
+
+    def match_locations(self, ngo_locations: list, grant_locations: list) -> np.ndarray:
+        """
+        For each grant location, whether any NGO location matches it: by gazetteer containment when both
+        sides are known places, otherwise by embedding similarity above the threshold.
+        """
+        hits = np.zeros(len(grant_locations), dtype=bool)
+        ngo_locations = sorted(set(ngo_locations))
+        if not ngo_locations or not grant_locations:
+            return hits
+
+        covered = set()
+        unknown_ngo = []
+        for location in ngo_locations:
+            name = self.resolve(location)
+            if name is None:
+                unknown_ngo.append(location)
+            else:
+                covered |= self.ancestors(name)
+
+        fuzzy = []  # (grant row, NGO locations to compare it with)
+        for row, location in enumerate(grant_locations):
+            name = self.resolve(location)
+            if name is None:
+                fuzzy.append((row, ngo_locations))
+            elif name in covered:
+                hits[row] = True
+            elif unknown_ngo:
+                # Known grant location: only NGO locations the gazetteer could not place need a fuzzy check.
+                fuzzy.append((row, unknown_ngo))
+        if not fuzzy or not self.sentence_model:
+            return hits
+
+        try:
+            grant_vectors = self.embed([grant_locations[row] for row, _ in fuzzy])
+            ngo_vectors = self.embed(ngo_locations)
+        except Exception as e:
+            logging.warning(f"Error encoding locations for geographic matching: {e}")
+            return hits
+
+        similarity = grant_vectors @ ngo_vectors.T
+        columns = {location: column for column, location in enumerate(ngo_locations)}
+        for position, (row, candidates) in enumerate(fuzzy):
+            if any(similarity[position, columns[location]] > self.threshold for location in candidates):
+                hits[row] = True
+        return hits
+
+    def matches(self, ngo_location: str, grant_location: str) -> bool:
+        return bool(self.match_locations([ngo_location], [grant_location])[0])
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+from ann_index import AnnIndex, catalog_key
+
+
+@dataclass
+class IndexedGrant:
+    """Everything match_grant needs about a grant that does not depend on the NGO."""
+    grant: dict
+    text_clean: str
+    deadline: datetime = None
+    geo_eligible: list = field(default_factory=list)
+    keywords: set = field(default_factory=set)
+    focus_areas: list = field(default_factory=list)
+    target_populations: list = field(default_factory=list)
+    embedding: np.ndarray = None
+    content_hash: str = None
+
+
+def grant_combined_text(grant: dict) -> str:
+    """Joins the descriptive fields of a grant into the text we score against."""
+    return f"{grant.get('title', '')} {grant.get('description', '')} " \
+           f"{' '.join(grant.get('focus_areas', []))} " \
+           f"{' '.join(grant.get('target_beneficiaries_focus', []))} " \
+           f"{grant.get('eligibility_criteria_text', '')}"
+
+
+def grant_hash(grant: dict) -> str:
+    """Hash of a grant's full content; equal hashes mean nothing derived from the grant needs recomputing."""
+    return hashlib.sha256(json.dumps(grant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _grant_strings(grant: dict) -> list:
+    """Every grant string that _prepare() runs through preprocess."""
+    return [grant_combined_text(grant), *grant.get("geographic_eligibility", []), *grant.get("keywords", []),
+            *grant.get("focus_areas", []), *grant.get("target_beneficiaries_focus", [])]
+
+
+def parse_deadline(value):
+    """Parses a YYYY-MM-DD deadline, returning None when it is missing or malformed."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+
+
+class GrantIndex:
+    """
+    Precomputed per-grant state, built once when the catalog loads. An index is not modified after
+    it is built: when the catalog changes, updated() builds a new one beside it, so requests still
+    holding the old index keep a consistent view.
+
+    With ann_dir set, grant embeddings live in a quantized, memory-mapped AnnIndex shared by every
+    process on the machine; a process that finds the index for its catalog already built skips
+    encoding altogether. candidates() is the retrieval stage in front of score_grants.
+    """
+
+    def __init__(self, grants: list, preprocess, sentence_model=None, tfidf_model=None, preprocess_many=None,
+                 ann_dir: str = None, ann_quantization: str = "float16", ann_nprobe: int = 8, previous=None,
+                 sentence_model_name: str = None):
+        self.preprocess = preprocess
+        self.preprocess_many = preprocess_many
+        self.sentence_model = sentence_model
+        self.sentence_model_name = sentence_model_name
+        self.tfidf_model = tfidf_model
+        self.ann_dir = ann_dir
+        self.ann_quantization = ann_quantization
+        self.ann_nprobe = ann_nprobe
+        self.ann = None
+        self.entries = []
+        self._by_id = {}
+        self._rows = {}
+        self._build(grants, previous)
+
+    def updated(self, grants: list) -> "GrantIndex":
+        """
+        A new index for grants. Grants whose content is unchanged keep their prepared entry and
+        embedding, so only new or modified grants are lemmatized and encoded. This index is left as it was.
+        """
+        return GrantIndex(grants, self.preprocess, self.sentence_model, tfidf_model=self.tfidf_model,
+                          preprocess_many=self.preprocess_many, ann_dir=self.ann_dir,
+                          ann_quantization=self.ann_quantization, ann_nprobe=self.ann_nprobe, previous=self,
+                          sentence_model_name=self.sentence_model_name)
+
+    def _build(self, grants: list, previous_index):
+        old_entries = previous_index.entries if previous_index is not None else []
+        old_ann = previous_index.ann if previous_index is not None else None
+        # Entries whose encoding failed are prepared again, so they get another chance at an embedding.
+        previous = {entry.content_hash: (entry, row) for row, entry in enumerate(old_entries)
+                    if entry.embedding is not None or old_ann is not None or not self.sentence_model}
+        hashes = [grant_hash(grant) for grant in grants]
+        changed = [grant for grant, digest in zip(grants, hashes) if digest not in previous]
+        preprocess = self.preprocess
+        if self.preprocess_many is not None:
+            # Lemmatize every new grant string in one batch, then serve _prepare from the results.
+            texts = list({text for grant in changed for text in _grant_strings(grant)})
+            processed = dict(zip(texts, self.preprocess_many(texts)))
+            preprocess = processed.__getitem__
+
+        ann_key = f"{catalog_key(hashes)}-{self._model_key()}-{self.ann_quantization}"
+        ann = AnnIndex.open(self.ann_dir, ann_key, nprobe=self.ann_nprobe) if self.ann_dir else None
+        entries, fresh = [], []
+        for grant, digest in zip(grants, hashes):
+            entry, old_row = previous.get(digest, (None, None))
+            if entry is None:
+                entry = self._prepare(grant, preprocess)
+                fresh.append(entry)
+            else:
+                entry = replace(entry, grant=grant)  # a copy: the previous index keeps its own entries
+                if entry.embedding is None and old_ann is not None and ann is None:
+                    entry.embedding = np.asarray(old_ann.source_vectors[old_row], dtype=np.float32)
+            entry.content_hash = digest
+            entries.append(entry)
+        if ann is None:
+            self._encode(fresh)
+        # else another process already encoded this exact catalog.
+
+        self.entries = entries
+        self._by_id = {id(entry.grant): entry for entry in entries}
+        self._rows = {id(entry): row for row, entry in enumerate(entries)}
+        self._build_matrices()
+        if self.ann_dir and self.sentence_model:
+            if ann is None and self.embedding_matrix.shape[1]:
+                os.makedirs(self.ann_dir, exist_ok=True)
+                ann = AnnIndex.build(self.ann_dir, ann_key, self.embedding_matrix, self.ann_quantization,
+                                     nprobe=self.ann_nprobe)
+            if ann is not None:
+                # Serve embeddings from the shared map and drop the private float32 copies.
+                self.embedding_matrix = ann.vectors
+                for entry in entries:
+                    entry.embedding = None
+        else:
+            ann = None
+        self.ann = ann
+        if self.tfidf_model is not None:
+            self.tfidf_model = self.tfidf_model.synced([entry.text_clean for entry in entries])
+        logging.info(f"Grant index built for {len(entries)} grants ({len(fresh)} new or changed).")
+
+    def _model_key(self) -> str:
+        """Identifies the sentence model and its dimension, so vectors from another model are never reused."""
+        dimension = getattr(self.sentence_model, "get_sentence_embedding_dimension", lambda: None)()
+        return hashlib.sha1(f"{self.sentence_model_name}:{dimension}".encode("utf-8")).hexdigest()[:8]
+
+    def embedding(self, entry: IndexedGrant):
+        """The grant's embedding, read from the shared ANN vectors when the entry does not hold its own."""
+        if entry.embedding is not None or self.ann is None:
+            return entry.embedding
+        row = self._rows.get(id(entry))
+        return None if row is None else np.asarray(self.ann.vectors[row], dtype=np.float32)
+
+    def candidates(self, query: np.ndarray, k: int, rows=None):
+        """
+        First retrieval stage: the k rows (within rows, if given) whose embeddings are closest to query.
+        Without an ANN index every row is a candidate.
+        """
+        if self.ann is None or query is None:
+            return rows
+        return self.ann.search(query, k, rows)
+
+    def lookup(self, grant: dict) -> IndexedGrant:
+        """Returns the indexed entry for a grant, preparing one on the fly if it is not in the catalog."""
+        entry = self._by_id.get(id(grant))
+        if entry is None:
+            entry = self._prepare(grant)
+            self._encode([entry])
+        return entry
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _prepare(self, grant: dict, preprocess=None) -> IndexedGrant:
+        preprocess = preprocess or self.preprocess
+        return IndexedGrant(
+            grant=grant,
+            text_clean=preprocess(grant_combined_text(grant)),
+            deadline=parse_deadline(grant.get("application_deadline")),
+            geo_eligible=[preprocess(loc) for loc in grant.get("geographic_eligibility", [])],
+            keywords=set(preprocess(kw) for kw in grant.get("keywords", [])),
+            focus_areas=[preprocess(area) for area in grant.get("focus_areas", [])],
+            target_populations=[preprocess(pop) for pop in grant.get("target_beneficiaries_focus", [])],
+        )
+
+    def _build_matrices(self):
+        """
+        Stacks the per-grant state into arrays for the batch scorer in scoring.py.
+        Phrase fields (focus areas, populations, geography) become sparse grant x phrase
+        matrices over the unique phrases of the catalog, so each phrase is tested once per request.
+        """
+        entries = self.entries
+        n = len(entries)
+
+        dim = next((entry.embedding.shape[0] for entry in entries if entry.embedding is not None), 0)
+        self.embedding_matrix = np.zeros((n, dim), dtype=np.float32)
+        for row, entry in enumerate(entries):
+            if entry.embedding is not None:
+                self.embedding_matrix[row] = entry.embedding
+
+        self.keyword_vocab, self.keyword_matrix = _phrase_matrix([entry.keywords for entry in entries])
+        self.keyword_counts = np.array([len(entry.keywords) for entry in entries], dtype=np.float32)
+        self.focus_phrases, self.focus_matrix = _phrase_matrix([entry.focus_areas for entry in entries])
+        self.population_phrases, self.population_matrix = _phrase_matrix([entry.target_populations for entry in entries])
+        self.geo_phrases, self.geo_matrix = _phrase_matrix([entry.geo_eligible for entry in entries])
+
+        self.has_geo = np.array([bool(entry.geo_eligible) for entry in entries], dtype=bool)
+        self.geo_has_global = np.array(["global" in entry.geo_eligible for entry in entries], dtype=bool)
+        self.geo_open = np.array(["global" in entry.geo_eligible or "worldwide" in entry.geo_eligible
+                                  for entry in entries], dtype=bool)
+
+        self.deadlines = np.array([entry.deadline.timestamp() if entry.deadline else np.nan for entry in entries],
+                                  dtype=np.float64)
+        self.min_budgets = np.array([_budget(entry.grant.get("min_budget")) for entry in entries], dtype=np.float64)
+        self.max_budgets = np.array([_budget(entry.grant.get("max_budget")) for entry in entries], dtype=np.float64)
+
+    def _encode(self, entries: list):
+        """Encodes all grant texts in one batched call; vectors are L2-normalized so cosine is a dot product."""
+        if not self.sentence_model or not entries:
+            return
+        try:
+            vectors = self.sentence_model.encode([entry.text_clean for entry in entries], normalize_embeddings=True)
+        except Exception as e:
+            logging.warning(f"Error encoding grants for the index: {e}")
+            return
+        for entry, vector in zip(entries, vectors):
+            entry.embedding = np.asarray(vector, dtype=np.float32)
+
+
+def _budget(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _phrase_matrix(rows: list):
+    """Builds a binary sparse (grant x phrase) matrix and the phrase -> column vocabulary."""
+    vocab = {}
+    indptr, indices = [0], []
+    for phrases in rows:
+        columns = {vocab.setdefault(phrase, len(vocab)) for phrase in phrases}
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                               shape=(len(rows), len(vocab)))
+    return vocab, matrix
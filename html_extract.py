@@ -0,0 +1,115 @@
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; the stdlib parser is used without it
+    etree = None
+
+STRIPPED_TAGS = {"script", "style", "noscript", "header", "footer", "nav", "aside", "form"}
+
+
+class _TextCollector:
+    """
+    Parser-target callbacks shared by both backends. Collects visible text outside STRIPPED_TAGS,
+    joined with single spaces like BeautifulSoup's get_text(separator=" ", strip=True).
+    """
+
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self.pieces = []
+        self.length = 0
+        self.skip_depth = 0
+        self._pending = []
+
+    @property
+    def done(self) -> bool:
+        return self.length >= self.max_length
+
+    def _flush(self):
+        # Text nodes can arrive in several data() calls; join them before stripping.
+        if self._pending:
+            text = "".join(self._pending).strip()
+            self._pending = []
+            if text and not self.skip_depth:
+                self.pieces.append(text)
+                self.length += len(text) + 1
+
+    def start(self, tag, attrib=None):
+        self._flush()
+        if tag in STRIPPED_TAGS:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if tag in STRIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, text):
+        if not self.skip_depth:
+            self._pending.append(text)
+
+    def comment(self, text):
+        pass
+
+    def close(self) -> str:
+        self._flush()
+        return " ".join(self.pieces)[:self.max_length]
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, collector: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class StreamingTextExtractor:
+    """
+    Incremental HTML-to-text extractor. Feed decoded chunks as they arrive; feed() returns True once
+    max_length characters of visible text have been collected so the caller can stop reading.
+    Uses lxml's C parser when it is installed, otherwise the stdlib html.parser.
+    """
+
+    def __init__(self, max_length: int, backend: str = None):
+        self.collector = _TextCollector(max_length)
+        self.backend = backend or ("lxml" if etree is not None else "html.parser")
+        if self.backend == "lxml":
+            self._parser = etree.HTMLParser(target=self.collector, recover=True)
+        else:
+            self._parser = _StdlibParser(self.collector)
+        self._closed = False
+
+    @property
+    def done(self) -> bool:
+        return self.collector.done
+
+    def feed(self, chunk: str) -> bool:
+        if chunk and not self.collector.done:
+            self._parser.feed(chunk)
+        return self.collector.done
+
+    def close(self) -> str:
+        if not self._closed:
+            self._closed = True
+            try:
+                self._parser.close()
+            except Exception:  # lxml raises on documents it could not parse at all
+                pass
+        return self.collector.close()
+
+
+def extract_text(html: str, max_length: int, backend: str = None, chunk_size: int = 65536) -> str:
+    """Extracts visible text from an HTML string, stopping as soon as max_length characters are collected."""
+    extractor = StreamingTextExtractor(max_length, backend)
+    for start in range(0, len(html), chunk_size):
+        if extractor.feed(html[start:start + chunk_size]):
+            break
+    return extractor.close()
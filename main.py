@@ -1,23 +1,31 @@
-from flask import Flask, render_template, request
-import aiohttp
+from flask import Flask, Response, jsonify, render_template, request
 import asyncio
-from bs4 import BeautifulSoup
-import requests
-import re
+import gc
+import pickle
+import threading
+from dataclasses import dataclass
 from datetime import datetime
 from urllib.parse import urlparse
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer, util
-import spacy
 import logging
-import pandas as pd
+from config import (ALLOW_REQUEST_PROFILING, ANN_CANDIDATES, ANN_INDEX_DIR, ANN_NPROBE, ANN_QUANTIZATION,
+                    FETCH_CACHE_PATH, GRANT_CATALOG_PATH, INGEST_CONCURRENCY, INGEST_MAX_PAGES, MAX_HTML_BYTES,
+                    MAX_TEXT_LENGTH, PRELOAD_MODELS, SENTENCE_MODEL_NAME, SPACY_AUTO_DOWNLOAD, SPACY_MODEL_NAME,
+                    TFIDF_MODEL_PATH, WEBSITE_CHUNK_OVERLAP, WEBSITE_EMBEDDING_POOLING)
+from fetcher import CacheStore, SiteFetcher, content_hash
+from catalog_store import GrantCatalog
+from doc_embedding import WebsiteEncoder
+from geo import GeoResolver
+from grant_index import GrantIndex
+from metrics import CACHE_EVENTS, CONTENT_TYPE, GRANTS_FILTERED, REGISTRY, REQUESTS, profiled, stage
+from models import ModelRegistry
+from scoring import DEFAULT_NGO_BUDGET, score_color, score_grants
+from text_norm import TextNormalizer, WebsiteAnalysis
+from tfidf_model import TfidfModel
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # ----- CONFIGURATION -----
-MAX_TEXT_LENGTH = 15000  # Increased slightly for more context
 SIMILARITY_WEIGHTS = {
     "embedding_sim": 0.4,
     "tfidf_sim": 0.2,
@@ -26,6 +34,7 @@ SIMILARITY_WEIGHTS = {
     "target_population_match": 0.15,
     "geographic_match_boost": 0.1,
 }
+MAX_RESULTS = 50  # Top eligible grants returned per request
 
 # --- EXAMPLE GRANTS ---
 GRANTS = [
@@ -97,26 +106,15 @@ GRANTS = [
 ]
 
 # ----- NLP MODELS -----
-try:
-    sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-    logging.info("SentenceTransformer model loaded successfully.")
-except Exception as e:
-    logging.error(f"Error loading SentenceTransformer model: {e}. Semantic similarity might be affected.", exc_info=True)
-    sentence_model = None
-
-try:
-    nlp = spacy.load("en_core_web_sm")
-    logging.info("spaCy model 'en_core_web_sm' loaded successfully.")
-except OSError:
-    logging.warning("spaCy model 'en_core_web_sm' not found. Attempting to download...")
-    try:
-        from spacy.cli import download
-        download("en_core_web_sm")
-        nlp = spacy.load("en_core_web_sm")
-        logging.info("spaCy model downloaded and loaded successfully.")
-    except Exception as e:
-        logging.error(f"Could not download or load spaCy model: {e}. Some NLP features may be limited.", exc_info=True)
-        nlp = None
+# Loaded on first use, or up front by preload() / warmup(); importing main stays fast.
+MODELS = ModelRegistry(SENTENCE_MODEL_NAME, SPACY_MODEL_NAME, spacy_download=SPACY_AUTO_DOWNLOAD)
+
+# Set by ensure_ready() together with the catalog and grant index below.
+sentence_model = None
+nlp = None
+NORMALIZER = None
+GEO_RESOLVER = None
+WEBSITE_ENCODER = None
 
 
 # ----- UTILITY FUNCTIONS -----
@@ -129,75 +127,83 @@ def validate_url(url: str) -> bool:
     except ValueError:
         return False
 
+CACHE_STORE = CacheStore(FETCH_CACHE_PATH)
+FETCHER = SiteFetcher(CACHE_STORE, MAX_TEXT_LENGTH, MAX_HTML_BYTES)
+
 async def extract_text_from_url_async(url: str) -> str:
     """
     Asynchronously fetches content from a URL and extracts clean text.
-    Handles various request-related errors.
+    Uses the shared pooled session and HTTP cache; errors come back as "Error: ..." messages.
     """
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=15, headers=headers) as response:
-                response.raise_for_status()
-                soup = BeautifulSoup(await response.text(), "html.parser")
-                for tag in soup(["script", "style", "noscript", "header", "footer", "nav", "aside", "form"]):
-                    tag.extract()
-                text = soup.get_text(separator=" ", strip=True)
-                return text[:MAX_TEXT_LENGTH]
-    except aiohttp.ClientTimeout:
-        logging.error(f"Timeout error fetching URL: {url}")
-        return "Error: Request to the website timed out. The website might be slow or unresponsive."
-    except aiohttp.ClientConnectionError:
-        logging.error(f"Connection error fetching URL: {url}")
-        return "Error: Could not connect to the website. Please check the URL or your internet connection."
-    except aiohttp.ClientResponseError as e:
-        logging.error(f"HTTP error {e.status} fetching URL: {url}")
-        return f"Error: Received HTTP {e.status} from the website. Check if the URL is correct or if the website is accessible."
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during URL extraction for {url}: {e}", exc_info=True)
-        return f"Error: An unexpected issue occurred while processing the website. Please try again."
+    return await FETCHER.fetch_text_async(url)
 
 def extract_text_from_url(url: str) -> str:
-    """Synchronous wrapper for async URL extraction."""
-    return asyncio.run(extract_text_from_url_async(url))
+    """Synchronous wrapper for async URL extraction, run on the fetcher's long-lived event loop."""
+    return FETCHER.fetch_text(url)
 
 def preprocess_text(text: str) -> str:
     """
     Cleans and preprocesses text using spaCy for lemmatization and stop word removal.
-    If spaCy is not loaded, falls back to basic regex cleaning.
+    If spaCy is not loaded, falls back to basic regex cleaning. Short strings are memoized.
     """
-    if not isinstance(text, str):
-        return ""
-    text = re.sub(r'<[^>]+>', '', text)
-    text = text.lower()
-    if nlp:
-        doc = nlp(text)
-        tokens = [token.lemma_ for token in doc if not token.is_stop and not token.is_punct and not token.is_space and token.is_alpha]
-        return " ".join(tokens)
-    else:
-        text = re.sub(r'[^a-z0-9\s]', '', text)
-        return ' '.join(text.split()).lower()
+    ensure_ready()
+    with stage("preprocess_text"):
+        return NORMALIZER.lemmatize(text)
 
-def extract_keywords_from_doc(spacy_doc) -> set:
-    """Extracts relevant keywords (lemmas of alpha tokens) from a spaCy Doc object."""
-    return set(token.lemma_ for token in spacy_doc if not token.is_stop and token.is_alpha and not token.is_punct)
+def analyze_website_text(website_raw_text: str) -> WebsiteAnalysis:
+    """
+    Lemmatized text, keywords and named entities for extracted website text, from a single spaCy pass.
+    Results are cached by content hash, so an unchanged site skips the nlp pass entirely.
+    """
+    ensure_ready()
+    model = f"{nlp.meta.get('name')}-{nlp.meta.get('version')}" if nlp else "regex"
+    key = f"{model}:{content_hash(website_raw_text)}"
+    cached = CACHE_STORE.get("website-analysis-v2", key)
+    if cached is not None:
+        try:
+            analysis = pickle.loads(cached)
+            CACHE_EVENTS.inc(cache="analysis", result="hit")
+            return analysis
+        except Exception as e:
+            logging.warning(f"Discarding unreadable cached analysis: {e}")
+    CACHE_EVENTS.inc(cache="analysis", result="miss")
+    with stage("nlp"):
+        analysis = NORMALIZER.analyze(website_raw_text)
+    CACHE_STORE.set("website-analysis-v2", key, pickle.dumps(analysis))
+    return analysis
+
+def embed_website_text(website_text_clean: str):
+    """
+    Chunk embeddings of a preprocessed website text, encoded in one batch; None without a sentence model.
+    The last text's result is reused, so scoring it against many grants encodes it once.
+    """
+    ensure_ready()
+    with stage("embedding"):
+        return WEBSITE_ENCODER.encode(website_text_clean)
 
 def compute_tfidf_similarity(text1: str, text2: str) -> float:
-    """Computes TF-IDF cosine similarity between two preprocessed text strings."""
+    """Computes TF-IDF cosine similarity between two preprocessed text strings using the catalog-fitted model."""
     if not text1 or not text2:
         return 0.0
+    ensure_ready()
     try:
-        tfidf = TfidfVectorizer(stop_words='english', max_features=5000)
-        tfidf_matrix = tfidf.fit_transform([text1, text2])
-        return float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
+        with stage("tfidf"):
+            return SNAPSHOT.tfidf.similarity(text1, text2)
     except Exception as e:
         logging.warning(f"Error computing TF-IDF similarity: {e}")
         return 0.0
 
-def match_grant(website_raw_text: str, website_doc_for_nlp, grant: dict) -> dict:
+def match_grant(website_raw_text: str, website_analysis: WebsiteAnalysis, grant: dict, entry=None) -> dict:
     """
-    Calculates a match score and eligibility for a given grant against NGO website content.
+    Calculates a match score and eligibility for a given grant against NGO website content
+    (the raw text and its analyze_website_text() result).
+    Grant-side text, lemmas and embeddings are read from the catalog snapshot's grant index rather than recomputed.
     """
+    ensure_ready()
+    grant_index = SNAPSHOT.index
+    if entry is None:
+        entry = grant_index.lookup(grant)
+
     match_details = {
         "score": 0.0,
         "color": "gray",
@@ -206,100 +212,94 @@ def match_grant(website_raw_text: str, website_doc_for_nlp, grant: dict) -> dict
         "link": grant.get("link")
     }
 
-    website_text_clean = website_doc_for_nlp.text if nlp else preprocess_text(website_raw_text) # use nlp from sacpy , if fail, use regex
-    website_keywords = extract_keywords_from_doc(website_doc_for_nlp) if nlp else set(re.findall(r'\b\w+\b', website_text_clean))
+    website_text_clean = website_analysis.text # lemmatized by spaCy, or regex-cleaned if it failed to load
+    website_keywords = website_analysis.keywords
 
     # --- Eligibility Checks ---
-    try:
-        deadline = datetime.strptime(grant['application_deadline'], "%Y-%m-%d")
-        if deadline < datetime.now():  # check deadline with current date
-            match_details["is_eligible"] = False
-            match_details["reasons_for_ineligibility"].append("Deadline has passed.")
-    except (ValueError, TypeError):
+    if entry.deadline is None:
         match_details["is_eligible"] = False
         match_details["reasons_for_ineligibility"].append("Invalid or missing deadline format for grant.")
+        GRANTS_FILTERED.inc(rule="deadline_missing")
+    elif entry.deadline < datetime.now():  # check deadline with current date
+        match_details["is_eligible"] = False
+        match_details["reasons_for_ineligibility"].append("Deadline has passed.")
+        GRANTS_FILTERED.inc(rule="deadline_passed")
 
     if not match_details["is_eligible"]:
         return match_details
 
-    grant_geo_eligible = [preprocess_text(loc) for loc in grant.get("geographic_eligibility", [])]
+    grant_geo_eligible = entry.geo_eligible
     ngo_locations = []
     if nlp:
-        ngo_locations = [ent.text.lower() for ent in website_doc_for_nlp.ents if ent.label_ in ["GPE", "LOC"]] # geoplitical entitiy or physical location
+        ngo_locations = [ent.text.lower() for ent in website_analysis.ents if ent.label_ in ["GPE", "LOC"]] # geoplitical entitiy or physical location
 
     geo_match_found = False
     # clean up the code below - geolocation elgibilty 
     if grant_geo_eligible:
-        if "global" in grant_geo_eligible or "worldwide" in grant_geo_eligible or  \
-        "global" in website_text_clean or "worldwide" in website_text_clean:
-            geo_match_found = True
-        else:
-            for grant_loc_kw in grant_geo_eligible:
-                if grant_loc_kw in website_text_clean:
-                    geo_match_found = True
-                    break
-                for ngo_loc_entity in ngo_locations:
-                    if sentence_model and util.cos_sim(sentence_model.encode(ngo_loc_entity), sentence_model.encode(grant_loc_kw)) > 0.75:
-                        geo_match_found = True
-                        break
-                if geo_match_found:
-                    break
+        with stage("geo"):
+            if "global" in grant_geo_eligible or "worldwide" in grant_geo_eligible or  \
+            "global" in website_text_clean or "worldwide" in website_text_clean:
+                geo_match_found = True
+            else:
+                geo_match_found = any(grant_loc_kw in website_text_clean for grant_loc_kw in grant_geo_eligible) or \
+                    bool(GEO_RESOLVER.match_locations(ngo_locations, grant_geo_eligible).any())
 
         if not geo_match_found and "global" not in grant_geo_eligible:
             match_details["is_eligible"] = False
             match_details["reasons_for_ineligibility"].append("Geographic focus mismatch.")
+            GRANTS_FILTERED.inc(rule="geo")
 
     if not match_details["is_eligible"]:
         return match_details
 
-    ngo_estimated_budget = 250000
+    ngo_estimated_budget = DEFAULT_NGO_BUDGET
     min_budget = grant.get("min_budget")
     max_budget = grant.get("max_budget")
 
     if min_budget is not None and ngo_estimated_budget < min_budget:
         match_details["is_eligible"] = False
         match_details["reasons_for_ineligibility"].append(f"NGO budget (${ngo_estimated_budget}) is below grant's minimum required (${min_budget}).")
+        GRANTS_FILTERED.inc(rule="budget_below_min")
     if max_budget is not None and ngo_estimated_budget > max_budget:
         match_details["is_eligible"] = False
         match_details["reasons_for_ineligibility"].append(f"NGO budget (${ngo_estimated_budget}) exceeds grant's maximum allowed (${max_budget}).")
+        GRANTS_FILTERED.inc(rule="budget_above_max")
 
     if not match_details["is_eligible"]:
         return match_details
 
     # --- Similarity Scoring ---
-    grant_combined_text = f"{grant.get('title', '')} {grant.get('description', '')} " \
-                         f"{' '.join(grant.get('focus_areas', []))} " \
-                         f"{' '.join(grant.get('target_beneficiaries_focus', []))} " \
-                         f"{grant.get('eligibility_criteria_text', '')}"
-    grant_text_clean = preprocess_text(grant_combined_text)
+    grant_text_clean = entry.text_clean
 
     embedding_sim = 0.0
-    if sentence_model:
+    grant_embedding = grant_index.embedding(entry)
+    if sentence_model and grant_embedding is not None:
         try:
-            embeddings = sentence_model.encode([website_text_clean, grant_text_clean], convert_to_tensor=True)
-            embedding_sim = float(util.cos_sim(embeddings[0], embeddings[1]))
+            website_embedding = embed_website_text(website_text_clean)
+            if website_embedding is not None:
+                embedding_sim = website_embedding.similarity(grant_embedding, WEBSITE_EMBEDDING_POOLING)
         except Exception as e:
             logging.warning(f"Error computing embedding similarity for grant {grant.get('title')}: {e}")
             embedding_sim = 0.0
 
     tfidf_score = compute_tfidf_similarity(website_text_clean, grant_text_clean)
-    grant_keywords_processed = set(preprocess_text(kw) for kw in grant.get('keywords', []))
+    grant_keywords_processed = entry.keywords
     overlap_score = len(website_keywords.intersection(grant_keywords_processed)) / len(grant_keywords_processed) if grant_keywords_processed else 0.0
 
     sector_score = 0.0
-    ngo_themes = [ent.text.lower() for ent in website_doc_for_nlp.ents if ent.label_ in ["ORG", "PRODUCT", "WORK_OF_ART", "EVENT", "NORP"]]
-    if not ngo_themes:
+    ngo_themes = [ent.text.lower() for ent in website_analysis.ents if ent.label_ in ["ORG", "PRODUCT", "WORK_OF_ART", "EVENT", "NORP"]]
+    if not ngo_themes and nlp:
         common_words = [word for word in website_text_clean.split() if len(word) > 3 and word not in nlp.Defaults.stop_words][:50]
         ngo_themes.extend(common_words)
 
-    for grant_focus_area in grant.get('focus_areas', []):
-        if preprocess_text(grant_focus_area) in website_text_clean:
+    for grant_focus_area in entry.focus_areas:
+        if grant_focus_area in website_text_clean:
             sector_score = 1.0
             break
 
     pop_score = 0.0
-    for grant_target_pop in grant.get('target_beneficiaries_focus', []):
-        if preprocess_text(grant_target_pop) in website_text_clean:
+    for grant_target_pop in entry.target_populations:
+        if grant_target_pop in website_text_clean:
             pop_score = 1.0
             break
 
@@ -316,67 +316,313 @@ def match_grant(website_raw_text: str, website_doc_for_nlp, grant: dict) -> dict
 
     final_score_percentage = round(min(1.0, max(0.0, raw_final_score)) * 100, 2)
     match_details["score"] = final_score_percentage
+    match_details["color"] = score_color(final_score_percentage)
 
-    if final_score_percentage >= 80:
-        match_details["color"] = "green"
-    elif final_score_percentage >= 50:
-        match_details["color"] = "yellow"
+    return match_details
+
+# ----- GRANT CATALOG & INDEX -----
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    The loaded catalog as one unit: catalog ids, their rows in the grant index, the index and its
+    TF-IDF model. A reload builds a new snapshot beside the live one and publishes it with a single
+    assignment to SNAPSHOT; a request reads SNAPSHOT once and uses only what it got.
+    """
+    version: int
+    ids: list
+    rows: dict
+    index: GrantIndex
+    tfidf: TfidfModel
+
+CATALOG = None
+SNAPSHOT = None
+_READY = False
+_RELOAD_LOCK = threading.Lock()
+_READY_LOCK = threading.Lock()
+_WARMUP_THREAD = None
+_WARMUP_LOCK = threading.Lock()
+
+def ensure_ready():
+    """
+    Loads the models and builds the grant catalog and index on first call; later calls return at once.
+    Every entry point that needs them calls this, so nothing heavy happens at import.
+    """
+    global _READY, sentence_model, nlp, NORMALIZER, GEO_RESOLVER, WEBSITE_ENCODER
+    global CATALOG, SNAPSHOT
+    if _READY:
+        return
+    with _READY_LOCK:
+        if _READY:
+            return
+        sentence_model, nlp = MODELS.load()
+        NORMALIZER = TextNormalizer(nlp)
+        GEO_RESOLVER = GeoResolver(sentence_model)
+        WEBSITE_ENCODER = WebsiteEncoder(sentence_model, WEBSITE_EMBEDDING_POOLING, WEBSITE_CHUNK_OVERLAP)
+
+        CATALOG = GrantCatalog(GRANT_CATALOG_PATH, NORMALIZER.lemmatize, GEO_RESOLVER)
+        CATALOG.seed(GRANTS)  # the example grants, on first creation only
+        SNAPSHOT = _load_snapshot(None)
+        _READY = True
+
+def _load_snapshot(previous):
+    """Builds a snapshot of the catalog as stored now, reusing previous's prepared grants when given."""
+    # Read the version first: a write racing the load then leaves this snapshot looking stale, not current.
+    version = CATALOG.version
+    ids, grants = CATALOG.load()
+    if previous is None:
+        index = GrantIndex(grants, NORMALIZER.lemmatize, sentence_model, tfidf_model=TfidfModel(TFIDF_MODEL_PATH),
+                           preprocess_many=NORMALIZER.lemmatize_many, ann_dir=ANN_INDEX_DIR,
+                           ann_quantization=ANN_QUANTIZATION, ann_nprobe=ANN_NPROBE,
+                           sentence_model_name=SENTENCE_MODEL_NAME)
     else:
-        match_details["color"] = "gray"
+        index = previous.index.updated(grants)
+    return CatalogSnapshot(version=version, ids=ids, rows={grant_id: row for row, grant_id in enumerate(ids)},
+                           index=index, tfidf=index.tfidf_model)
 
-    return match_details
+def wait_for_refit():
+    """
+    Waits for a background TF-IDF refit of the live snapshot, so the refitted vocabulary is in use and
+    saved. For processes that exit or fork soon after loading; servers let the refit finish on its own.
+    """
+    ensure_ready()
+    SNAPSHOT.tfidf.wait_for_refit()
+
+def current_snapshot() -> CatalogSnapshot:
+    """
+    The live catalog snapshot, first reloaded if the stored catalog has changed since it was loaded,
+    e.g. by the nightly scrape_grants run in another process. While one request reloads, others keep
+    using the snapshot they have.
+    """
+    global SNAPSHOT
+    ensure_ready()
+    snapshot = SNAPSHOT
+    if CATALOG.version != snapshot.version and _RELOAD_LOCK.acquire(blocking=False):
+        try:
+            if CATALOG.version != SNAPSHOT.version:
+                logging.info("Grant catalog changed on disk; reloading the grant index.")
+                SNAPSHOT = _load_snapshot(SNAPSHOT)
+            snapshot = SNAPSHOT
+        finally:
+            _RELOAD_LOCK.release()
+    return snapshot
+
+def open_catalog() -> GrantCatalog:
+    """
+    The grant catalog with the matcher's lemmatizer and gazetteer, without loading the sentence model
+    or building the grant index. For writers like the scrape_grants CLI, whose work should stay
+    proportional to what changed; running servers pick the changes up through the catalog version.
+    """
+    if _READY:
+        return CATALOG
+    return GrantCatalog(GRANT_CATALOG_PATH, TextNormalizer(MODELS.nlp).lemmatize, GeoResolver())
+
+def warmup():
+    """Builds everything and runs each model once, so the first real request is not slow."""
+    ensure_ready()
+    MODELS.warmup()
+    SNAPSHOT.tfidf.similarities("warmup")
+    NORMALIZER.log_timing_report()  # mostly the catalog's lemmatization at this point
+
+def start_warmup():
+    """Runs warmup() in a background thread unless one is already running or done; returns at once."""
+    global _WARMUP_THREAD
+    with _WARMUP_LOCK:
+        if MODELS.warm or (_WARMUP_THREAD is not None and _WARMUP_THREAD.is_alive()):
+            return
+        _WARMUP_THREAD = threading.Thread(target=warmup, name="warmup", daemon=True)
+        _WARMUP_THREAD.start()
+
+def preload():
+    """
+    For pre-fork servers: call in the master before workers fork (e.g. gunicorn --preload with
+    NGO_PRELOAD_MODELS=1). Workers then share the models and grant index copy-on-write; freezing
+    the GC keeps collections in the workers from touching, and so copying, those pages. A pending
+    TF-IDF refit is finished first: its thread would not survive the fork.
+    """
+    wait_for_refit()
+    gc.freeze()
+
+def readiness() -> dict:
+    """
+    Readiness report for orchestrators: ready once the index is built and both models have loaded and
+    run once. A process whose model load failed reports state "degraded" and is never ready.
+    """
+    warm = _READY and MODELS.warm
+    state = ("degraded" if MODELS.failed else "ready") if warm else "starting"
+    return {
+        "ready": state == "ready",
+        "state": state,
+        "models": MODELS.status(),
+        "grants": len(SNAPSHOT.index) if SNAPSHOT is not None else 0,
+        "nlp_timings": NORMALIZER.timing_report() if NORMALIZER is not None else {},
+    }
+
+def reload_catalog():
+    """
+    Reloads the grant catalog from the store and swaps in an index built for it.
+    Requests already running finish on the snapshot they started with.
+    """
+    global SNAPSHOT
+    ensure_ready()
+    with _RELOAD_LOCK:
+        SNAPSHOT = _load_snapshot(SNAPSHOT)
+
+def refresh_grants(max_pages: int = INGEST_MAX_PAGES, concurrency: int = INGEST_CONCURRENCY,
+                   refresh_known: bool = False) -> list:
+    """
+    Ingests new and changed grants from the listing sources into the catalog and re-indexes.
+    Only the grants that changed are re-embedded. Returns their keys.
+    """
+    from scrape_grants import ingest_grants  # BeautifulSoup is only needed for ingestion
+    ensure_ready()
+    changed = asyncio.run(ingest_grants(CATALOG, max_pages, concurrency, refresh_known))
+    if changed:
+        reload_catalog()
+    return changed
+
+def set_grants(grants: list):
+    """Replaces the grant catalog and rebuilds the precomputed index for it."""
+    ensure_ready()
+    CATALOG.replace(grants)
+    reload_catalog()
+
+# ----- MATCHING PIPELINE -----
+NO_ELIGIBLE_GRANTS_MESSAGE = "No eligible grants found based on your NGO's profile. Please ensure the URL is correct or try a different one."
+
+def match_website(website_raw_text: str, top_k: int = MAX_RESULTS) -> list:
+    """
+    Runs NLP analysis, catalog pre-filtering, embedding retrieval and batch scoring for extracted website text.
+    Returns the top_k eligible grants by score, then any pre-filter survivors the full check rejected.
+    """
+    snapshot = current_snapshot()  # read once: ids, rows, index and TF-IDF must all come from the same catalog load
+    website_analysis = analyze_website_text(website_raw_text)
+    if not nlp:
+        logging.warning("spaCy model not loaded, proceeding with limited NLP features.")
+
+    website_text_clean = website_analysis.text
+    ngo_locations = [ent.text.lower() for ent in website_analysis.ents if ent.label_ in ["GPE", "LOC"]]
+
+    # Expired, budget-incompatible and out-of-region grants are dropped by one indexed catalog query;
+    # the counts per rule come from indexed COUNTs alongside it.
+    with stage("prefilter"):
+        candidate_ids, filtered = CATALOG.eligible_ids(datetime.now(), DEFAULT_NGO_BUDGET, website_text_clean,
+                                                       ngo_locations)
+        rows = [snapshot.rows[grant_id] for grant_id in candidate_ids if grant_id in snapshot.rows]
+    for rule, count in filtered.items():
+        if count:
+            GRANTS_FILTERED.inc(count, rule=rule)
+    if not rows:
+        return []
+
+    website_embedding = None
+    try:
+        website_embedding = embed_website_text(website_text_clean)
+    except Exception as e:
+        logging.warning(f"Error encoding website text: {e}")
+    # Only the grants closest in embedding space get the full weighted scoring. Retrieval uses the
+    # mean of the chunk vectors; with max pooling the final score then uses each grant's best chunk.
+    prefiltered = len(rows)
+    with stage("retrieval"):
+        rows = snapshot.index.candidates(website_embedding.mean if website_embedding else None, ANN_CANDIDATES, rows)
+    GRANTS_FILTERED.inc(prefiltered - len(rows), rule="retrieval")
+    with stage("tfidf"):
+        tfidf_scores = snapshot.tfidf.similarities(website_text_clean, rows)
+
+    with stage("scoring"):
+        scored = score_grants(snapshot.index, SIMILARITY_WEIGHTS, website_text_clean, website_analysis.keywords,
+                              ngo_locations, tfidf_scores=tfidf_scores,
+                              website_embedding=website_embedding.query(WEBSITE_EMBEDDING_POOLING) if website_embedding else None,
+                              geo_resolver=GEO_RESOLVER, top_k=top_k, rows=rows)
+    match_results = []
+    for entry, match_data in scored: # use a database here/ scalable / psql
+        grant = entry.grant
+        match_results.append({
+            "title": grant["title"],
+            "description": grant["description"],
+            "score": match_data["score"],
+            "color": match_data["color"],
+            "link": match_data["link"],
+            "is_eligible": match_data["is_eligible"],
+            "reasons_for_ineligibility": match_data["reasons_for_ineligibility"]
+        })
+    match_results.sort(key=lambda x: (x["is_eligible"], x["score"]), reverse=True)
+    return match_results
 
 # ----- FLASK APP -----
 app = Flask(__name__)
 
 @app.route("/", methods=["GET", "POST"])
 def index():
+    """
+    Matches the submitted URL against the catalog. With profile=1 (form field or query string) and
+    ALLOW_REQUEST_PROFILING on, the page also shows how long each stage of this request took.
+    """
+    if request.method != "POST":
+        return render_template("index.html", matches=[], error=None)
+
     match_results = []
     error_message = None
-
-    if request.method == "POST":
+    outcome = "ok"
+    profile_requested = ALLOW_REQUEST_PROFILING and request.values.get("profile") in ("1", "true", "on")
+    with profiled(profile_requested) as profile:
         url = request.form.get("url", "").strip()
         if not validate_url(url):
+            REQUESTS.inc(endpoint="index", outcome="invalid_url")
             return render_template("index.html", error="Invalid URL. Please enter a valid HTTP/HTTPS URL.")
 
         logging.info(f"Received request for URL: {url}")
         website_raw_text = extract_text_from_url(url)
         if website_raw_text.startswith("Error"):
             error_message = website_raw_text
+            outcome = "fetch_error"
             logging.error(f"Scraping failed for {url}: {error_message}")
         else:
-            website_processed_text = preprocess_text(website_raw_text)
-            website_doc_for_nlp = None
-            if nlp:
-                website_doc_for_nlp = nlp(website_processed_text)
-            else:
-                logging.warning("spaCy model not loaded, proceeding with limited NLP features.")
-                website_doc_for_nlp = type('obj', (object,), {'text': website_processed_text, 'ents': []})()
-
-            eligible_grants_found = False
-            for grant in GRANTS: # use a database here/ scalable / psql
-                match_data = match_grant(website_raw_text, website_doc_for_nlp, grant)
-                match_results.append({
-                    "title": grant["title"],
-                    "description": grant["description"],
-                    "score": match_data["score"],
-                    "color": match_data["color"],
-                    "link": match_data["link"],
-                    "is_eligible": match_data["is_eligible"],
-                    "reasons_for_ineligibility": match_data["reasons_for_ineligibility"]
-                })
-                if match_data["is_eligible"]:
-                    eligible_grants_found = True
-                else:
-                    logging.info(f"Grant '{grant['title']}' is ineligible for '{url}'. Reasons: {', '.join(match_data['reasons_for_ineligibility'])}")
-
-            if not eligible_grants_found and not error_message:
-                error_message = "No eligible grants found based on your NGO's profile. Please ensure the URL is correct or try a different one."
-
-            match_results.sort(key=lambda x: (x["is_eligible"], x["score"]), reverse=True)
-
-    return render_template("index.html", matches=match_results, error=error_message)
+            match_results = match_website(website_raw_text)
+            for match in match_results:
+                if not match["is_eligible"]:
+                    logging.info(f"Grant '{match['title']}' is ineligible for '{url}'. Reasons: {', '.join(match['reasons_for_ineligibility'])}")
+
+            if not any(match["is_eligible"] for match in match_results):
+                error_message = NO_ELIGIBLE_GRANTS_MESSAGE
+                outcome = "no_match"
+
+        REQUESTS.inc(endpoint="index", outcome=outcome)
+        # Rendering is timed into the histogram but finishes after the profile shown on the page is taken.
+        with stage("render"):
+            return render_template("index.html", matches=match_results, error=error_message,
+                                   profile=profile.as_dict() if profile else None)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of this process's stage latencies and counters."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up, whether or not the models are loaded."""
+    return jsonify({"status": "ok"})
+
+@app.route("/ready")
+def ready():
+    """
+    Readiness: 503 until the models are loaded and warm, so no traffic is routed to a cold worker.
+    The first probe starts warming up in the background.
+    """
+    status = readiness()
+    if not status["ready"]:
+        start_warmup()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/warmup", methods=["POST"])
+def warmup_endpoint():
+    """Loads and warms the models now instead of on the first request."""
+    warmup()
+    return jsonify(readiness())
+
+if PRELOAD_MODELS:
+    preload()
 
 if __name__ == "__main__":
+    warmup()
     app.run(host="0.0.0.0", port=5000, debug=True)
 # port 5000
\ No newline at end of file
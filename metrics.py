@@ -0,0 +1,173 @@
+"""
+Process-local metrics for the matching pipeline, exposed in the Prometheus text format.
+
+stage() times a block into the ngo_stage_seconds histogram and, when the current request is being
+profiled (inside profiled()), into that request's Profile as well. The profile travels in a
+contextvar, so it follows a request across awaits and into executor threads started with
+contextvars.copy_context().run.
+
+Every process keeps its own numbers; with several workers, scrape each one or aggregate upstream.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if position < len(self.buckets):
+                series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "ngo_stage_seconds", "Time spent in each stage of fetching and matching.", ("stage",)))
+REQUESTS = REGISTRY.register(Counter(
+    "ngo_requests_total", "Matching requests by endpoint and outcome.", ("endpoint", "outcome")))
+CACHE_EVENTS = REGISTRY.register(Counter(
+    "ngo_cache_events_total", "Cache lookups by cache and result.", ("cache", "result")))
+FETCH_ERRORS = REGISTRY.register(Counter(
+    "ngo_fetch_errors_total", "Website fetch failures by type.", ("type",)))
+GRANTS_FILTERED = REGISTRY.register(Counter(
+    "ngo_grants_filtered_total", "Grants removed from a request's results, by the rule that removed them.", ("rule",)))
+
+
+# ----- per-request profiling -----
+
+class Profile:
+    """Stage breakdown of one request, in the order the stages finished."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages.append((name, seconds))
+
+    def as_dict(self) -> dict:
+        totals = {}
+        with self._lock:
+            for name, seconds in self.stages:
+                calls, total = totals.get(name, (0, 0.0))
+                totals[name] = (calls + 1, total + seconds)
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": [{"stage": name, "calls": calls, "seconds": round(total, 6)}
+                       for name, (calls, total) in totals.items()],
+        }
+
+
+_PROFILE = contextvars.ContextVar("ngo_profile", default=None)
+
+
+@contextmanager
+def profiled(enabled: bool = True):
+    """Collects a stage breakdown for the enclosed block (a request); yields the Profile, or None if disabled."""
+    if not enabled:
+        yield None
+        return
+    profile = Profile()
+    token = _PROFILE.set(profile)
+    try:
+        yield profile
+    finally:
+        _PROFILE.reset(token)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    profile = _PROFILE.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
@@ -0,0 +1,110 @@
+"""
+Lazy, process-wide registry for the NLP models.
+
+Importing this module is cheap: torch, sentence_transformers and spaCy are only imported the first
+time a model is needed. load() brings both models in without running them, which is what a
+pre-fork server should call in its master so workers share the model pages copy-on-write;
+warmup() additionally runs each model once so the first real request does not pay for lazy
+initialization inside torch and spaCy.
+"""
+import logging
+import threading
+import time
+
+_NOT_LOADED = object()
+
+
+class ModelRegistry:
+    """Loads the SentenceTransformer and spaCy pipeline on first use, once per process."""
+
+    def __init__(self, sentence_model_name: str, spacy_model_name: str, spacy_download: bool = False):
+        self.sentence_model_name = sentence_model_name
+        self.spacy_model_name = spacy_model_name
+        self.spacy_download = spacy_download
+        self._models = {"sentence_model": _NOT_LOADED, "nlp": _NOT_LOADED}
+        self._lock = threading.Lock()
+        self.load_seconds = {}
+        self.warm = False
+
+    @property
+    def sentence_model(self):
+        return self._get("sentence_model", self._load_sentence_model)
+
+    @property
+    def nlp(self):
+        return self._get("nlp", self._load_spacy)
+
+    def _get(self, name: str, loader):
+        model = self._models[name]
+        if model is _NOT_LOADED:
+            with self._lock:
+                model = self._models[name]
+                if model is _NOT_LOADED:
+                    start = time.perf_counter()
+                    model = loader()
+                    self.load_seconds[name] = round(time.perf_counter() - start, 3)
+                    self._models[name] = model
+        return model
+
+    def _load_sentence_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.sentence_model_name)
+            logging.info("SentenceTransformer model loaded successfully.")
+            return model
+        except Exception as e:
+            logging.error(f"Error loading SentenceTransformer model: {e}. Semantic similarity might be affected.", exc_info=True)
+            return None
+
+    def _load_spacy(self):
+        try:
+            import spacy
+        except Exception as e:
+            logging.error(f"Could not import spaCy: {e}. Some NLP features may be limited.", exc_info=True)
+            return None
+        try:
+            nlp = spacy.load(self.spacy_model_name)
+            logging.info(f"spaCy model '{self.spacy_model_name}' loaded successfully.")
+            return nlp
+        except OSError:
+            if not self.spacy_download:
+                logging.error(f"spaCy model '{self.spacy_model_name}' not found. Install it with "
+                              f"'python -m spacy download {self.spacy_model_name}'. Some NLP features may be limited.")
+                return None
+        logging.warning(f"spaCy model '{self.spacy_model_name}' not found. Attempting to download...")
+        try:
+            from spacy.cli import download
+            download(self.spacy_model_name)
+            nlp = spacy.load(self.spacy_model_name)
+            logging.info("spaCy model downloaded and loaded successfully.")
+            return nlp
+        except Exception as e:
+            logging.error(f"Could not download or load spaCy model: {e}. Some NLP features may be limited.", exc_info=True)
+            return None
+
+    def load(self):
+        """Loads both models without running them."""
+        return self.sentence_model, self.nlp
+
+    def warmup(self):
+        """Loads both models and runs each once on a short text."""
+        sentence_model, nlp = self.load()
+        start = time.perf_counter()
+        if sentence_model is not None:
+            sentence_model.encode(["warmup"], normalize_embeddings=True)
+        if nlp is not None:
+            nlp("Warmup text for Nairobi, Kenya.")
+        self.load_seconds["warmup"] = round(time.perf_counter() - start, 3)
+        self.warm = True
+
+    @property
+    def failed(self) -> list:
+        """Names of the models whose load failed; the app then runs with reduced matching."""
+        return [name for name, model in self._models.items() if model is None]
+
+    def status(self) -> dict:
+        def state(name):
+            model = self._models[name]
+            return "not loaded" if model is _NOT_LOADED else ("failed" if model is None else "loaded")
+        return {"sentence_model": state("sentence_model"), "nlp": state("nlp"), "warm": self.warm,
+                "load_seconds": dict(self.load_seconds)}
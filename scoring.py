@@ -0,0 +1,150 @@
+from datetime import datetime
+
+import numpy as np
+
+from metrics import GRANTS_FILTERED, stage
+
+DEFAULT_NGO_BUDGET = 250000
+
+
+def score_color(score: float) -> str:
+    """Maps a 0-100 match score to the colour shown in the results table."""
+    if score >= 80:
+        return "green"
+    elif score >= 50:
+        return "yellow"
+    return "gray"
+
+
+def _phrase_hits(phrases: dict, text: str) -> np.ndarray:
+    """Tests each unique catalog phrase against the website text once; returns a hit vector by column."""
+    hits = np.zeros(len(phrases), dtype=np.float32)
+    for phrase, column in phrases.items():
+        if phrase in text:
+            hits[column] = 1.0
+    return hits
+
+
+def score_grants(index, weights: dict, website_text_clean: str, website_keywords: set, ngo_locations: list,
+                 website_embedding=None, tfidf_scores=None, geo_resolver=None, top_k: int = None,
+                 include_ineligible: bool = True, ngo_budget: int = DEFAULT_NGO_BUDGET, now: datetime = None,
+                 rows=None) -> list:
+    """
+    Scores grants in a GrantIndex against one NGO in a single vectorized pass.
+    Applies the same eligibility rules and weighting as match_grant. rows restricts scoring to those index
+    rows (e.g. the catalog's pre-filtered candidates); tfidf_scores is indexed by row either way.
+    website_embedding is one vector, or a matrix of website chunk vectors compared by best chunk.
+    Returns (IndexedGrant, match_details) pairs: the top_k eligible grants by score, followed by the
+    ineligible ones when include_ineligible is set.
+    """
+    rows = np.arange(len(index)) if rows is None else np.asarray(rows, dtype=np.int64)
+    n = len(rows)
+    if n == 0:
+        return []
+    now = now or datetime.now()
+
+    # --- Eligibility Checks ---
+    deadline_missing = np.isnan(index.deadlines[rows])
+    deadline_passed = ~deadline_missing & (index.deadlines[rows] < now.timestamp())
+    deadline_ok = ~(deadline_missing | deadline_passed)
+
+    with stage("geo"):
+        website_open = "global" in website_text_clean or "worldwide" in website_text_clean
+        location_hits = _phrase_hits(index.geo_phrases, website_text_clean)
+        if geo_resolver is not None and ngo_locations:
+            geo_phrases = sorted(index.geo_phrases, key=index.geo_phrases.get)
+            location_hits = np.maximum(location_hits, geo_resolver.match_locations(ngo_locations, geo_phrases))
+        has_geo = index.has_geo[rows]
+        geo_match = index.geo_open[rows] | website_open | (index.geo_matrix[rows] @ location_hits > 0)
+        geo_ok = ~has_geo | geo_match
+
+    with np.errstate(invalid="ignore"):
+        below_min = ngo_budget < index.min_budgets[rows]
+        above_max = ngo_budget > index.max_budgets[rows]
+    budget_ok = ~(below_min | above_max)
+
+    eligible = deadline_ok & geo_ok & budget_ok
+    # Deadline and geo failures are counted under the first rule a grant fails, in match_grant's order.
+    geo_failed = deadline_ok & ~geo_ok
+    budget_failed = deadline_ok & geo_ok & ~budget_ok
+    for rule, failed in (("deadline_missing", deadline_missing), ("deadline_passed", deadline_passed),
+                         ("geo", geo_failed), ("budget_below_min", budget_failed & below_min),
+                         ("budget_above_max", budget_failed & above_max)):
+        count = int(failed.sum())
+        if count:
+            GRANTS_FILTERED.inc(count, rule=rule)
+
+    # --- Similarity Scoring ---
+    embedding_sim = np.zeros(n, dtype=np.float32)
+    if website_embedding is not None and index.embedding_matrix.shape[1]:
+        query = np.asarray(website_embedding, dtype=np.float32)
+        embedding_sim = index.embedding_matrix[rows] @ query.T
+        if query.ndim == 2:  # one row per website chunk: score each grant by its best chunk
+            embedding_sim = embedding_sim.max(axis=1)
+
+    tfidf_sim = np.zeros(n, dtype=np.float32) if tfidf_scores is None else np.asarray(tfidf_scores, dtype=np.float32)[rows]
+
+    keyword_vector = np.zeros(len(index.keyword_vocab), dtype=np.float32)
+    for keyword in website_keywords:
+        column = index.keyword_vocab.get(keyword)
+        if column is not None:
+            keyword_vector[column] = 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keyword_counts = index.keyword_counts[rows]
+        overlap = np.where(keyword_counts > 0, (index.keyword_matrix[rows] @ keyword_vector) / keyword_counts, 0.0)
+
+    sector = (index.focus_matrix[rows] @ _phrase_hits(index.focus_phrases, website_text_clean) > 0).astype(np.float32)
+    population = (index.population_matrix[rows] @ _phrase_hits(index.population_phrases, website_text_clean) > 0).astype(np.float32)
+
+    raw_scores = (
+        embedding_sim * weights["embedding_sim"] +
+        tfidf_sim * weights["tfidf_sim"] +
+        overlap * weights["keyword_overlap"] +
+        sector * weights["sector_match"] +
+        population * weights["target_population_match"]
+    )
+    raw_scores = raw_scores + (geo_match & has_geo & ~index.geo_has_global[rows]) * weights["geographic_match_boost"]
+    scores = np.round(np.clip(raw_scores, 0.0, 1.0) * 100, 2)
+
+    eligible_rows = np.flatnonzero(eligible)
+    if top_k is not None and top_k < len(eligible_rows):
+        top = np.argpartition(-scores[eligible_rows], top_k - 1)[:top_k]
+        eligible_rows = eligible_rows[top]
+    eligible_rows = eligible_rows[np.argsort(-scores[eligible_rows], kind="stable")]
+
+    results = []
+    for row in eligible_rows:
+        entry = index.entries[rows[row]]
+        score = float(scores[row])
+        results.append((entry, {
+            "score": score,
+            "color": score_color(score),
+            "is_eligible": True,
+            "reasons_for_ineligibility": [],
+            "link": entry.grant.get("link"),
+        }))
+
+    if include_ineligible:
+        for row in np.flatnonzero(~eligible):
+            entry = index.entries[rows[row]]
+            reasons = []
+            if deadline_missing[row]:
+                reasons.append("Invalid or missing deadline format for grant.")
+            elif deadline_passed[row]:
+                reasons.append("Deadline has passed.")
+            elif not geo_ok[row]:
+                reasons.append("Geographic focus mismatch.")
+            else:
+                if below_min[row]:
+                    reasons.append(f"NGO budget (${ngo_budget}) is below grant's minimum required (${entry.grant.get('min_budget')}).")
+                if above_max[row]:
+                    reasons.append(f"NGO budget (${ngo_budget}) exceeds grant's maximum allowed (${entry.grant.get('max_budget')}).")
+            results.append((entry, {
+                "score": 0.0,
+                "color": "gray",
+                "is_eligible": False,
+                "reasons_for_ineligibility": reasons,
+                "link": entry.grant.get("link"),
+            }))
+
+    return results
@@ -1,30 +1,315 @@
-import requests
+"""
+Incremental grant ingestion into the grant catalog.
+
+    python scrape_grants.py --max-pages 20
+
+Listing pages are read newest first and a source stops paginating at the first page with no grant
+the catalog has not seen, so a nightly run only touches what was published since the last one.
+Detail pages are fetched concurrently and parsed into the fields match_grant uses. Near-duplicates
+(the same call listed by several sources) are dropped by SimHash, and GrantCatalog.upsert skips
+grants whose content has not changed. The CLI only writes the catalog; running servers see the new
+catalog version on their next request and re-index, embedding only the new or modified grants.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from datetime import datetime
+from urllib.parse import urljoin
+
+import aiohttp
 from bs4 import BeautifulSoup
 
-def fetch_latest_grants(limit=5):
-    url = "https://www2.fundsforngos.org/category/latest-funds-for-ngos/"
-    headers = {"User-Agent": "Mozilla/5.0"}
+from catalog_store import grant_fingerprint, grant_key
+from config import INGEST_CONCURRENCY, INGEST_MAX_PAGES, MAX_HTML_BYTES
+from dedup import NearDuplicateIndex
+from fetcher import USER_AGENT
+from geo import ALIASES, REGION_PARENTS, normalize_location
 
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
+# Listing sources, newest first. CSS selectors locate each grant on the listing and its body on the detail page.
+SOURCES = [
+    {
+        "name": "fundsforngos",
+        "first_page": "https://www2.fundsforngos.org/category/latest-funds-for-ngos/",
+        "page_url": "https://www2.fundsforngos.org/category/latest-funds-for-ngos/page/{page}/",
+        "item": "article",
+        "title": "h2 a",
+        "summary": "div.entry-summary",
+        "content": "div.entry-content",
+    },
+]
+
+# Focus areas and beneficiary groups, with the words that signal them in a grant description.
+FOCUS_AREAS = {
+    "Education": ("education", "school", "literacy", "learning", "scholarship"),
+    "Health": ("health", "medical", "disease", "hiv", "malaria", "nutrition", "sanitation"),
+    "Environment": ("environment", "climate", "biodiversity", "conservation", "ecosystem", "renewable"),
+    "Agriculture": ("agriculture", "farming", "farmers", "food security", "livestock"),
+    "Livelihoods": ("livelihood", "income generation", "employment", "entrepreneurship", "microfinance"),
+    "Vocational Training": ("vocational", "skills training", "apprenticeship"),
+    "Human Rights": ("human rights", "justice", "civil liberties", "advocacy"),
+    "Gender Equality": ("gender", "women's empowerment", "gender-based violence"),
+    "Humanitarian Aid": ("humanitarian", "emergency", "disaster", "relief"),
+    "Water": ("water", "wash"),
+    "Arts and Culture": ("arts", "culture", "heritage"),
+    "Governance": ("governance", "democracy", "civil society", "accountability"),
+    "Technology": ("technology", "digital", "innovation", "ict"),
+}
+TARGET_POPULATIONS = {
+    "Women and girls": ("women", "girls"),
+    "Youth": ("youth", "young people", "adolescents"),
+    "Children": ("children", "child"),
+    "Refugees": ("refugees", "displaced", "asylum"),
+    "Persons with disabilities": ("disabilities", "disabled"),
+    "Rural communities": ("rural",),
+    "Indigenous peoples": ("indigenous",),
+    "Older people": ("elderly", "older people"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%b-%Y", "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y", "%d/%m/%Y")
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}|\d{1,2}[-\s][A-Za-z]{3,9}[-\s]\d{4}|[A-Za-z]{3,9}\s\d{1,2},?\s\d{4}|\d{1,2}/\d{1,2}/\d{4}')
+AMOUNT_PATTERN = re.compile(r'(?:US\$|\$|USD|EUR|€|GBP|£)\s?(\d[\d,]*(?:\.\d+)?)\s*(million|m\b|k\b|thousand)?', re.IGNORECASE)
+# Names the gazetteer knows; ambiguous aliases ("us", "international") are left out of free-text matching.
+GEO_NAMES = sorted((set(REGION_PARENTS) | {"global"} | set(ALIASES)) - {"us", "world", "america", "african", "international"},
+                   key=len, reverse=True)
+GEO_PATTERN = re.compile(r'\b(' + '|'.join(re.escape(name) for name in GEO_NAMES) + r')\b')
+
+
+# ----- field extraction -----
+
+def _sentences(text: str) -> list:
+    return [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+|\n+', text) if sentence.strip()]
+
+
+def extract_deadline(text: str):
+    """Returns the first date after the word "deadline" as YYYY-MM-DD, or None."""
+    for match in re.finditer(r'deadline', text, re.IGNORECASE):
+        for candidate in DATE_PATTERN.findall(text[match.end():match.end() + 80]):
+            candidate = candidate.replace(",", "")
+            for date_format in DATE_FORMATS:
+                try:
+                    return datetime.strptime(candidate, date_format).strftime("%Y-%m-%d")
+                except ValueError:
+                    continue
+    return None
+
+
+def _amount(number: str, unit: str) -> float:
+    value = float(number.replace(",", ""))
+    unit = (unit or "").lower()
+    if unit in ("million", "m"):
+        value *= 1_000_000
+    elif unit in ("k", "thousand"):
+        value *= 1_000
+    return value
+
+
+def extract_budgets(text: str):
+    """
+    Returns (min_budget, max_budget) for the applicant's annual budget, from sentences that mention
+    a budget or turnover; either is None when the page does not state it.
+    """
+    for sentence in _sentences(text):
+        lowered = sentence.lower()
+        if "budget" not in lowered and "turnover" not in lowered:
+            continue
+        amounts = [_amount(number, unit) for number, unit in AMOUNT_PATTERN.findall(sentence)]
+        if len(amounts) >= 2:
+            return min(amounts), max(amounts)
+        if amounts:
+            if re.search(r'up to|maximum|less than|not exceed|below|under', lowered):
+                return None, amounts[0]
+            if re.search(r'at least|minimum|more than|exceed|above|over', lowered):
+                return amounts[0], None
+    return None, None
+
+
+def extract_geography(text: str) -> list:
+    """
+    Gazetteer places named in the eligibility sentences (or anywhere, if there are none),
+    e.g. ["Kenya", "East Africa"].
+    """
+    sentences = [sentence for sentence in _sentences(text)
+                 if re.search(r'eligib|countries|based in|located in|registered in|open to', sentence, re.IGNORECASE)]
+    places = []
+    for sentence in sentences or [text]:
+        for name in GEO_PATTERN.findall(normalize_location(sentence)):
+            name = ALIASES.get(name, name)
+            if name not in places:
+                places.append(name)
+    return [place.title() for place in places]
+
+
+def _labels(text: str, vocabulary: dict) -> list:
+    lowered = text.lower()
+    return [label for label, words in vocabulary.items()
+            if any(re.search(r'\b' + re.escape(word) + r'\b', lowered) for word in words)]
+
+
+def parse_grant(title: str, link: str, summary: str, body: str, source: str) -> dict:
+    """Builds a catalog grant (the GRANTS schema in main.py) from a listing entry and its detail page text."""
+    text = f"{summary}\n{body}" if body else summary
+    min_budget, max_budget = extract_budgets(text)
+    focus_areas = _labels(f"{title} {text}", FOCUS_AREAS)
+    populations = _labels(text, TARGET_POPULATIONS)
+    eligibility = " ".join(sentence for sentence in _sentences(text) if re.search(r'eligib', sentence, re.IGNORECASE))
+    return {
+        "title": title,
+        "description": summary or body[:500],
+        "application_deadline": extract_deadline(text),
+        "focus_areas": focus_areas,
+        "target_beneficiaries_focus": populations,
+        "eligibility_criteria_text": eligibility,
+        "geographic_eligibility": extract_geography(text),
+        "min_budget": min_budget,
+        "max_budget": max_budget,
+        "link": link,
+        "keywords": [label.lower() for label in focus_areas + populations],
+        "source": source,
+    }
+
+
+# ----- fetching -----
+
+async def _get_html(session: aiohttp.ClientSession, url: str):
+    """Returns the page HTML, or None for a missing page (the end of a listing)."""
+    async with session.get(url) as response:
+        if response.status == 404:
+            return None
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        body = await response.content.read(MAX_HTML_BYTES)
+        return body.decode(response.charset or "utf-8", errors="replace")
+
+
+def _parse_listing(html: str, source: dict, base_url: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    items = []
+    for article in soup.select(source["item"]):
+        title_tag = article.select_one(source["title"])
+        summary_tag = article.select_one(source["summary"])
+        if title_tag and title_tag.get("href"):
+            items.append({
+                "title": title_tag.get_text(strip=True),
+                "link": urljoin(base_url, title_tag["href"]),
+                "summary": summary_tag.get_text(" ", strip=True) if summary_tag else "",
+            })
+    return items
+
+
+def _parse_detail(html: str, source: dict) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    content = soup.select_one(source["content"]) or soup.body or soup
+    for tag in content.select("script, style, nav, aside, form"):
+        tag.decompose()
+    return content.get_text("\n", strip=True)
+
+
+async def _fetch_grant(session, slots: asyncio.Semaphore, source: dict, item: dict):
+    async with slots:
+        try:
+            html = await _get_html(session, item["link"])
+        except Exception as e:
+            logging.warning(f"Could not fetch grant page {item['link']}: {e}")
+            return None
+    body = _parse_detail(html, source) if html else ""
+    return parse_grant(item["title"], item["link"], item["summary"], body, source["name"])
+
 
-        articles = soup.select("article")[:limit]
-        grants = []
+async def _crawl_source(session, slots: asyncio.Semaphore, source: dict, known: set, seen: set,
+                        max_pages: int, refresh_known: bool, limit: int = None) -> list:
+    """Walks one source's listing pages, fetching detail pages as they are discovered, for at most limit grants."""
+    tasks = []
+    for page in range(1, max_pages + 1):
+        url = source["first_page"] if page == 1 else source["page_url"].format(page=page)
+        async with slots:
+            try:
+                html = await _get_html(session, url)
+            except Exception as e:
+                logging.warning(f"Could not fetch listing {url}: {e}")
+                break
+        if html is None:
+            break
+        items = [item for item in _parse_listing(html, source, url) if item["link"] not in seen]
+        unseen = [item for item in items if item["link"] not in known]
+        seen.update(item["link"] for item in items)
+        wanted = items if refresh_known else unseen
+        if limit is not None:
+            wanted = wanted[:limit - len(tasks)]
+        for item in wanted:
+            tasks.append(asyncio.create_task(_fetch_grant(session, slots, source, item)))
+        if limit is not None and len(tasks) >= limit:
+            break
+        if not unseen:
+            logging.info(f"{source['name']}: no new grants on page {page}; stopping.")
+            break
+    return [grant for grant in await asyncio.gather(*tasks) if grant is not None]
 
-        for article in articles:
-            title_tag = article.select_one("h2 a")
-            desc_tag = article.select_one("div.entry-summary")
 
-            if title_tag and desc_tag:
-                grants.append({
-                    "title": title_tag.get_text(strip=True),
-                    "description": desc_tag.get_text(strip=True)
-                })
+async def fetch_grants(known: set = frozenset(), sources: list = None, max_pages: int = INGEST_MAX_PAGES,
+                       concurrency: int = INGEST_CONCURRENCY, refresh_known: bool = False,
+                       limit: int = None) -> list:
+    """
+    Returns grants from every source that are not in known (links), or also the known ones on the
+    pages visited when refresh_known is set, so edits to recent grants are picked up.
+    With limit, only the first limit listed grants of each source have their detail page fetched.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    seen = set()
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30),
+                                     headers={"User-Agent": USER_AGENT}) as session:
+        results = await asyncio.gather(*(_crawl_source(session, slots, source, known, seen, max_pages, refresh_known,
+                                                       limit) for source in sources or SOURCES))
+    return [grant for grants in results for grant in grants]
 
-        return grants
 
+def drop_near_duplicates(grants: list, catalog_fingerprints: list) -> list:
+    """Drops grants that are a near-duplicate of a different catalog grant or of one earlier in the list."""
+    index = NearDuplicateIndex()
+    for key, fingerprint in catalog_fingerprints:
+        index.add(fingerprint, key)
+    unique = []
+    for grant in grants:
+        key, fingerprint = grant_key(grant), grant_fingerprint(grant)
+        duplicate = index.find(fingerprint)
+        if duplicate is not None and duplicate != key:
+            logging.info(f"Skipping {key}: near-duplicate of {duplicate}.")
+            continue
+        index.add(fingerprint, key)
+        unique.append(grant)
+    return unique
+
+
+async def ingest_grants(catalog, max_pages: int = INGEST_MAX_PAGES, concurrency: int = INGEST_CONCURRENCY,
+                        refresh_known: bool = False, sources: list = None) -> list:
+    """Fetches new grants into the catalog. Returns the keys of grants inserted or updated."""
+    grants = await fetch_grants(catalog.keys(), sources, max_pages, concurrency, refresh_known)
+    grants = drop_near_duplicates(grants, catalog.fingerprints())
+    changed = catalog.upsert(grants)
+    logging.info(f"Ingestion: {len(grants)} grants fetched, {len(changed)} new or changed.")
+    return changed
+
+
+def fetch_latest_grants(limit=5):
+    """Latest grants from the first listing page of each source, without touching the catalog."""
+    try:
+        return asyncio.run(fetch_grants(max_pages=1, limit=limit))[:limit]
     except Exception as e:
         print(f"[Scraper Error]: {e}")
         return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest new and changed grants into the grant catalog.")
+    parser.add_argument("--max-pages", type=int, default=INGEST_MAX_PAGES, help="Listing pages read per source at most")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY, help="Concurrent page fetches")
+    parser.add_argument("--refresh-known", action="store_true", help="Also re-fetch known grants on visited pages")
+    args = parser.parse_args()
+    import main as app  # the catalog needs the same lemmatizer as the matcher
+    changed = asyncio.run(ingest_grants(app.open_catalog(), args.max_pages, args.concurrency, args.refresh_known))
+    print(f"{len(changed)} grants inserted or updated.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
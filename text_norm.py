@@ -0,0 +1,171 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass, field
+
+from metrics import CACHE_EVENTS, record_stage
+
+# Lemmas only need tok2vec, tagger, attribute_ruler and lemmatizer.
+LEMMA_DISABLED = ("parser", "ner")
+# Entities only need NER (and the tok2vec layer it may listen to), run on the raw (cased) text.
+ENTITY_COMPONENTS = ("tok2vec", "ner")
+
+Entity = namedtuple("Entity", ["text", "label_"])
+
+
+@dataclass
+class WebsiteAnalysis:
+    """Everything the matcher needs from one NGO website: lemmatized text, keywords and named entities."""
+    text: str
+    keywords: set = field(default_factory=set)
+    ents: list = field(default_factory=list)
+
+
+def _strip_markup(text: str) -> str:
+    return re.sub(r'<[^>]+>', '', text)
+
+
+def _keep(token) -> bool:
+    return not token.is_stop and not token.is_punct and not token.is_space and token.is_alpha
+
+
+class TextNormalizer:
+    """
+    Lemmatization and website analysis on top of a spaCy pipeline.
+
+    - Short strings (grant fields, locations) are memoized in a bounded LRU.
+    - Bulk work goes through lemmatize_many(), which batches cache misses through each component.
+    - Lemmas run without the parser and NER, on lowercased text; NER runs alone on the cased website text.
+    - Time spent in each component is accumulated; see timing_report().
+
+    Without a spaCy pipeline it falls back to the regex cleaning preprocess_text always used.
+    """
+
+    def __init__(self, nlp, cache_size: int = 50000, short_text_limit: int = 200, batch_size: int = 256):
+        self.nlp = nlp
+        self.cache_size = cache_size
+        self.short_text_limit = short_text_limit
+        self.batch_size = batch_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._timings = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # ----- lemmatization -----
+
+    def lemmatize(self, text: str) -> str:
+        """Same output as the original preprocess_text: lowercased lemmas without stop words or punctuation."""
+        return self.lemmatize_many([text])[0]
+
+    def lemmatize_many(self, texts: list) -> list:
+        results = [None] * len(texts)
+        pending = {}
+        for position, text in enumerate(texts):
+            if not isinstance(text, str):
+                results[position] = ""
+                continue
+            cached = self._cache_get(text)
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.setdefault(text, []).append(position)
+
+        if pending:
+            unique = list(pending)
+            cleaned = [_strip_markup(text).lower() for text in unique]
+            if self.nlp:
+                docs = self._process(cleaned, LEMMA_DISABLED)
+                lemmas = [" ".join(token.lemma_ for token in doc if _keep(token)) for doc in docs]
+            else:
+                lemmas = [' '.join(re.sub(r'[^a-z0-9\s]', '', text).split()) for text in cleaned]
+            for text, lemma in zip(unique, lemmas):
+                self._cache_put(text, lemma)
+                for position in pending[text]:
+                    results[position] = lemma
+        return results
+
+    def _cache_get(self, text: str):
+        if len(text) > self.short_text_limit:
+            return None
+        with self._lock:
+            value = self._cache.get(text)
+            if value is None:
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+                self._cache.move_to_end(text)
+        CACHE_EVENTS.inc(cache="lemma", result="miss" if value is None else "hit")
+        return value
+
+    def _cache_put(self, text: str, lemma: str):
+        if len(text) > self.short_text_limit:
+            return
+        with self._lock:
+            self._cache[text] = lemma
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ----- website analysis -----
+
+    def analyze(self, raw_text: str) -> WebsiteAnalysis:
+        """
+        The lemmatized text, keywords and GPE/ORG/... entities of the raw website text.
+        Lemmas and keywords come from the lowercased text, as preprocess_text did: the tagger reads
+        title-case words as proper nouns and keeps their surface form. Entities come from the cased
+        text, which NER handles far better; that pass runs NER alone.
+        """
+        if not isinstance(raw_text, str):
+            return WebsiteAnalysis(text="")
+        processed = self.lemmatize(raw_text)
+        if not self.nlp:
+            return WebsiteAnalysis(text=processed, keywords=set(re.findall(r'\b\w+\b', processed)))
+        disabled = tuple(name for name in self.nlp.pipe_names if name not in ENTITY_COMPONENTS)
+        doc = self._process([_strip_markup(raw_text)], disabled)[0]
+        return WebsiteAnalysis(
+            text=processed,
+            keywords=set(processed.split()),
+            ents=[Entity(ent.text, ent.label_) for ent in doc.ents],
+        )
+
+    # ----- pipeline execution -----
+
+    def _process(self, texts: list, disabled: tuple) -> list:
+        """Runs the pipeline component by component over a batch, timing each one."""
+        start = time.perf_counter()
+        docs = [self.nlp.make_doc(text) for text in texts]
+        self._record("tokenizer", start, len(docs))
+        for name, component in self.nlp.pipeline:
+            if name in disabled:
+                continue
+            start = time.perf_counter()
+            if hasattr(component, "pipe"):
+                docs = list(component.pipe(docs, batch_size=self.batch_size))
+            else:
+                docs = [component(doc) for doc in docs]
+            self._record(name, start, len(docs))
+        return docs
+
+    def _record(self, name: str, start: float, count: int):
+        elapsed = time.perf_counter() - start
+        record_stage(f"spacy_{name}", elapsed)
+        with self._lock:
+            calls, docs, seconds = self._timings.get(name, (0, 0, 0.0))
+            self._timings[name] = (calls + 1, docs + count, seconds + elapsed)
+
+    def timing_report(self) -> dict:
+        """Per-component totals since start-up: {component: {"calls", "docs", "seconds"}}."""
+        with self._lock:
+            return {name: {"calls": calls, "docs": docs, "seconds": round(seconds, 6)}
+                    for name, (calls, docs, seconds) in self._timings.items()}
+
+    def log_timing_report(self):
+        report = self.timing_report()
+        total = sum(item["seconds"] for item in report.values()) or 1.0
+        for name, item in sorted(report.items(), key=lambda pair: -pair[1]["seconds"]):
+            logging.info(f"spaCy {name}: {item['seconds']:.3f}s ({item['seconds'] / total:.0%}) "
+                         f"over {item['docs']} docs in {item['calls']} batches")
+        logging.info(f"Lemma cache: {self.cache_hits} hits, {self.cache_misses} misses, {len(self._cache)} entries")
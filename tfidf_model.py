@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class TfidfModel:
+    """
+    TF-IDF vectorizer fitted once over the whole grant catalog, with the grant matrix precomputed.
+    Rows are L2-normalized, so scoring an NGO is one transform plus one sparse matrix-vector product.
+
+    synced() returns a model aligned with a changed catalog: unchanged grants keep their rows, new
+    ones are transformed with the current vocabulary, and a background refit is started once more
+    than refit_fraction of the catalog has been added since the last full fit. A refit swaps in a new
+    vocabulary for the same rows, so row numbers never change under a reader.
+    """
+
+    def __init__(self, path: str = None, max_features: int = 5000, refit_fraction: float = 0.1):
+        self.path = path
+        self.max_features = max_features
+        self.refit_fraction = refit_fraction
+        self.vectorizer = None
+        self.matrix = None
+        self.texts = []
+        self.doc_hashes = []
+        self._rows = {}
+        self._added_since_fit = 0
+        self._lock = threading.Lock()
+        self._refit_thread = None
+        self._superseded = False
+        self._last_text = None
+        self._last_vector = None
+        if path:
+            self.load()
+
+    # ----- persistence -----
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            import joblib
+            state = joblib.load(self.path)
+            self.vectorizer = state["vectorizer"]
+            self.matrix = state["matrix"]
+            self.doc_hashes = state["doc_hashes"]
+            self._rows = {h: row for row, h in enumerate(self.doc_hashes)}
+            logging.info(f"TF-IDF model loaded from {self.path} ({len(self.doc_hashes)} grants).")
+            return True
+        except Exception as e:
+            logging.warning(f"Could not load TF-IDF model from {self.path}: {e}. It will be refitted.")
+            return False
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            state = {"vectorizer": self.vectorizer, "matrix": self.matrix, "doc_hashes": list(self.doc_hashes)}
+        # Batch workers, forked servers and refit threads may save at once: each writes its own file.
+        tmp_path = f"{self.path}.tmp{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            import joblib
+            joblib.dump(state, tmp_path)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Could not save TF-IDF model to {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # ----- fitting -----
+
+    def fit(self, texts: list):
+        """Fits the vectorizer on the full catalog and rebuilds the grant matrix."""
+        vectorizer, matrix = self._fit(texts)
+        with self._lock:
+            self._install(vectorizer, matrix, texts)
+            self._added_since_fit = 0
+        self.save()
+
+    def synced(self, texts: list) -> "TfidfModel":
+        """
+        A model whose rows are texts (one per grant, in catalog order), reusing this model's rows for
+        grants it already has. This model is left as it was; it is returned itself if nothing changed.
+        """
+        texts = list(texts)
+        hashes = [_text_hash(text) for text in texts]
+        with self._lock:
+            if hashes == self.doc_hashes:
+                self.texts = texts  # a model loaded from disk has rows but no texts to refit from
+                return self
+            vectorizer, matrix, rows, added = self.vectorizer, self.matrix, self._rows, self._added_since_fit
+            self._superseded = True  # a refit still running here must not overwrite the newer model on disk
+
+        model = TfidfModel(None, self.max_features, self.refit_fraction)
+        model.path = self.path
+        if vectorizer is None:
+            model.fit(texts)
+            return model
+
+        new_rows = [row for row, h in enumerate(hashes) if h not in rows]
+        if new_rows:
+            stacked = sparse.vstack([matrix, vectorizer.transform([texts[row] for row in new_rows])], format="csr")
+        else:
+            stacked = matrix
+        fresh = {row: matrix.shape[0] + position for position, row in enumerate(new_rows)}
+        order = [fresh[row] if row in fresh else rows[h] for row, h in enumerate(hashes)]
+        model._install(vectorizer, stacked[order], texts)
+        model._added_since_fit = added + len(new_rows)
+
+        logging.info(f"TF-IDF model synced: {len(new_rows)} new grants transformed, {len(texts) - len(new_rows)} reused.")
+        # Saved now, so a process that exits before a refit finishes still leaves the new rows on disk.
+        model.save()
+        if model._added_since_fit > self.refit_fraction * max(len(texts), 1):
+            model.refit_in_background()
+        return model
+
+    def refit_in_background(self):
+        """Refits IDF weights on a worker thread; the current model keeps serving until the new one is swapped in."""
+        if self._refit_thread and self._refit_thread.is_alive():
+            return
+
+        def _run():
+            try:
+                texts = list(self.texts)
+                vectorizer, matrix = self._fit(texts)
+                if vectorizer is None:
+                    return
+                with self._lock:
+                    self._install(vectorizer, matrix, texts)
+                    self._added_since_fit = 0
+                    superseded = self._superseded
+                if not superseded:
+                    self.save()
+                logging.info(f"TF-IDF model refitted on {len(texts)} grants.")
+            except Exception as e:
+                logging.warning(f"Background TF-IDF refit failed: {e}")
+
+        self._refit_thread = threading.Thread(target=_run, name="tfidf-refit", daemon=True)
+        self._refit_thread.start()
+
+    def wait_for_refit(self, timeout: float = None):
+        """Blocks until a background refit of this model has been installed and saved. Offline and short-lived processes call this."""
+        thread = self._refit_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _fit(self, texts: list):
+        # scikit-learn takes about a second to import; only fitting needs it.
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(stop_words='english', max_features=self.max_features)
+        try:
+            matrix = vectorizer.fit_transform(texts).tocsr()
+        except ValueError as e:  # empty vocabulary, e.g. an empty catalog
+            logging.warning(f"Could not fit TF-IDF model: {e}")
+            return None, None
+        return vectorizer, matrix
+
+    def _install(self, vectorizer, matrix, texts: list):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.texts = list(texts)
+        self.doc_hashes = [_text_hash(text) for text in texts]
+        self._rows = {h: row for row, h in enumerate(self.doc_hashes)}
+        self._last_text = None
+        self._last_vector = None
+
+    # ----- scoring -----
+
+    def _transform(self, text: str, vectorizer):
+        """Transforms the NGO text, reusing the last result since match_grant asks once per grant."""
+        with self._lock:
+            if self._last_text == (vectorizer, text):
+                return self._last_vector
+        vector = vectorizer.transform([text])
+        with self._lock:
+            self._last_text, self._last_vector = (vectorizer, text), vector
+        return vector
+
+    def similarities(self, text: str, rows=None) -> np.ndarray:
+        """
+        Cosine similarity of one preprocessed text against every grant, in catalog order.
+        With rows, only those grants are scored and the rest are left at zero.
+        """
+        with self._lock:
+            matrix, vectorizer, n = self.matrix, self.vectorizer, len(self.doc_hashes)
+        scores = np.zeros(n, dtype=np.float32)
+        if not text or vectorizer is None or matrix is None:
+            return scores
+        vector = self._transform(text, vectorizer)
+        if rows is None:
+            scores[:] = (matrix @ vector.T).toarray().ravel()
+        else:
+            scores[rows] = (matrix[rows] @ vector.T).toarray().ravel()
+        return scores
+
+    def similarity(self, text: str, grant_text: str) -> float:
+        """Cosine similarity of one preprocessed text against a single grant text."""
+        with self._lock:
+            matrix, vectorizer = self.matrix, self.vectorizer
+            row = self._rows.get(_text_hash(grant_text))
+        if not text or not grant_text or vectorizer is None:
+            return 0.0
+        grant_vector = matrix[row] if row is not None else vectorizer.transform([grant_text])
+        return float((grant_vector @ self._transform(text, vectorizer).T).toarray()[0, 0])